@@ -0,0 +1,48 @@
+import asyncio
+
+ALBUM_TTL = 60
+
+
+class MediaGroupCollector:
+    """
+    Собирает части альбома Telegram, приходящие отдельными апдейтами.
+
+    Части складываются в список Redis, поэтому альбом собирается корректно, даже если
+    апдейты обрабатывают разные процессы шлюза. add не ждёт остальных частей: вызов,
+    добавивший первую часть, получает True и должен запустить отдельную задачу,
+    которая дождётся альбома через wait_complete. Так обработчик не занимает воркер
+    чата на время debounce и следующие части альбома обрабатываются сразу.
+    """
+
+    def __init__(self, r, debounce, max_items):
+        self.r = r
+        self.debounce = debounce
+        self.max_items = max_items
+
+    def _key(self, key):
+        return f"album:{key}"
+
+    async def add(self, key, item):
+        """Добавляет часть альбома. Возвращает True, если это первая часть."""
+        list_key = self._key(key)
+        pipe = self.r.pipeline(transaction=False)
+        pipe.rpush(list_key, item)
+        pipe.expire(list_key, ALBUM_TTL)
+        length, _ = await pipe.execute()
+        # Остальные вызовы: альбом собирает другая задача или он уже закрыт и это запоздавшая часть
+        return length == 1
+
+    async def wait_complete(self, key):
+        """Ждёт, пока набралось max_items частей или новых частей не было debounce секунд."""
+        list_key = self._key(key)
+        loop = asyncio.get_running_loop()
+        length = await self.r.llen(list_key)
+        last_growth = loop.time()
+        while length < self.max_items and loop.time() - last_growth < self.debounce:
+            await asyncio.sleep(self.debounce / 5)
+            current = await self.r.llen(list_key)
+            if current != length:
+                length, last_growth = current, loop.time()
+
+        # Ключ живёт до истечения TTL, чтобы запоздавшие части не открыли новый альбом
+        return await self.r.lrange(list_key, 0, self.max_items - 1)
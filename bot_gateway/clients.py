@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import aiohttp
+from config import (
+    USER_SERVICE_URL, MATCHMAKING_SERVICE_URL, RATING_SERVICE_URL,
+    HTTP_TIMEOUT, HTTP_CONNECT_TIMEOUT, HTTP_LIMIT, HTTP_LIMIT_PER_HOST,
+    HTTP_RETRIES, HTTP_RETRY_BACKOFF,
+)
+
+logger = logging.getLogger(__name__)
+
+_session = None
+# Повтор этих запросов не меняет результат; остальные повторяются, только если соединение не установилось
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+
+def get_session():
+    """Общая для всего шлюза сессия aiohttp с пулом keep-alive соединений."""
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=HTTP_LIMIT, limit_per_host=HTTP_LIMIT_PER_HOST),
+            timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        )
+    return _session
+
+
+async def close_session():
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+class ServiceError(Exception):
+    pass
+
+
+class ServiceClient:
+    def __init__(self, base_url, retries=HTTP_RETRIES, backoff=HTTP_RETRY_BACKOFF):
+        self.base_url = base_url.rstrip("/")
+        self.retries = retries
+        self.backoff = backoff
+
+    async def request(self, method, path, idempotent=None, **kwargs):
+        """
+        Выполняет запрос и возвращает (status, json). Сетевые ошибки и 5xx повторяются с экспоненциальной
+        задержкой, если запрос идемпотентен (по методу или явному idempotent). Неидемпотентный запрос
+        повторяется, только если до сервиса не удалось подключиться и запрос заведомо не ушёл.
+        """
+        url = f"{self.base_url}{path}"
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        for attempt in range(self.retries + 1):
+            try:
+                async with get_session().request(method, url, **kwargs) as resp:
+                    if resp.status >= 500:
+                        raise ServiceError(f"{method} {url}: HTTP {resp.status}")
+                    data = await resp.json() if resp.status < 400 else None
+                    return resp.status, data
+            except (aiohttp.ClientError, asyncio.TimeoutError, ServiceError) as e:
+                retryable = idempotent or isinstance(e, aiohttp.ClientConnectorError)
+                if attempt == self.retries or not retryable:
+                    raise ServiceError(f"{method} {url}: {e}") from e
+                await asyncio.sleep(self.backoff * 2 ** attempt)
+
+
+class UserServiceClient(ServiceClient):
+    async def get_profile(self, user_id):
+        status, data = await self.request("GET", f"/profile/{user_id}")
+        return data if status == 200 else None
+
+    async def get_profiles(self, user_ids):
+        """Загружает несколько анкет одним запросом. Возвращает словарь user_id -> профиль."""
+        user_ids = [str(i) for i in user_ids]
+        if not user_ids:
+            return {}
+        try:
+            status, data = await self.request("GET", "/profiles", params={"ids": ",".join(user_ids)})
+        except ServiceError as e:
+            logger.warning(f"❌ Не удалось загрузить анкеты: {e}")
+            return {}
+        if status != 200:
+            return {}
+        return {p["user_id"]: p for p in data}
+
+    async def save_profile(self, profile):
+        status, _ = await self.request("POST", "/profile", json=profile)
+        return status == 200
+
+
+class MatchmakingClient(ServiceClient):
+    async def match(self, user_id, limit=1, mark_seen=True):
+        params = {"user_id": user_id, "limit": limit, "mark_seen": str(mark_seen).lower()}
+        # /match забирает кандидатов из очереди, поэтому повтор после ответа пропустил бы анкеты
+        status, data = await self.request("GET", "/match", idempotent=False, params=params)
+        return data if status == 200 else []
+
+    async def mark_seen(self, user_id, user_ids):
+        status, _ = await self.request("POST", "/seen", idempotent=True, json={"user_id": user_id, "ids": [str(i) for i in user_ids]})
+        return status == 200
+
+
+class RatingClient(ServiceClient):
+    async def rate(self, profile):
+        status, data = await self.request("POST", "/rate", json=profile)
+        return data if status == 200 else None
+
+    async def get_rating(self, user_id):
+        status, data = await self.request("GET", f"/rating/{user_id}")
+        return data["rating"] if status == 200 else None
+
+
+user_client = UserServiceClient(USER_SERVICE_URL)
+matchmaking_client = MatchmakingClient(MATCHMAKING_SERVICE_URL)
+rating_client = RatingClient(RATING_SERVICE_URL)
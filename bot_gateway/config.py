@@ -1,6 +1,6 @@
 import os
 from minio import Minio
-import redis
+import redis.asyncio as redis
 
 MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "minio:9000")
 MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "minio")
@@ -18,4 +18,72 @@ minio_client = Minio(
 REDIS_HOST = os.getenv("REDIS_HOST", "redis")
 REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
 
-r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))
+
+redis_pool = redis.ConnectionPool(
+    host=REDIS_HOST,
+    port=REDIS_PORT,
+    max_connections=REDIS_MAX_CONNECTIONS,
+    decode_responses=True
+)
+r = redis.Redis(connection_pool=redis_pool)
+
+USER_SERVICE_URL = os.getenv("USER_SERVICE_URL", "http://user_service:8000")
+MATCHMAKING_SERVICE_URL = os.getenv("MATCHMAKING_SERVICE_URL", "http://matchmaking_service:8000")
+RATING_SERVICE_URL = os.getenv("RATING_SERVICE_URL", "http://rating_service:8000")
+
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", 10))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 3))
+HTTP_LIMIT = int(os.getenv("HTTP_LIMIT", 100))
+HTTP_LIMIT_PER_HOST = int(os.getenv("HTTP_LIMIT_PER_HOST", 30))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", 2))
+HTTP_RETRY_BACKOFF = float(os.getenv("HTTP_RETRY_BACKOFF", 0.2))
+
+ALBUM_DEBOUNCE = float(os.getenv("ALBUM_DEBOUNCE", 0.5))
+MAX_PROFILE_PHOTOS = int(os.getenv("MAX_PROFILE_PHOTOS", 3))
+PHOTO_UPLOAD_CONCURRENCY = int(os.getenv("PHOTO_UPLOAD_CONCURRENCY", 4))
+
+PHOTO_MAX_SIDE = int(os.getenv("PHOTO_MAX_SIDE", 1280))
+PHOTO_PREVIEW_SIDE = int(os.getenv("PHOTO_PREVIEW_SIDE", 320))
+PHOTO_JPEG_QUALITY = int(os.getenv("PHOTO_JPEG_QUALITY", 85))
+
+FSM_TTL = int(os.getenv("FSM_TTL", 60 * 60 * 24))
+# Число шардов апдейтов (0 - обычный polling в одном процессе) и шарды этого процесса.
+# Без GATEWAY_SHARD_IDS процесс берёт все шарды, поэтому при нескольких репликах их нужно разделить
+GATEWAY_SHARDS = int(os.getenv("GATEWAY_SHARDS", 0))
+GATEWAY_SHARD_IDS = [int(s) for s in os.getenv("GATEWAY_SHARD_IDS", "").split(",") if s.strip()]
+
+# Способ получения апдейтов: polling или webhook
+UPDATE_MODE = os.getenv("UPDATE_MODE", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_ENQUEUE_TIMEOUT = float(os.getenv("WEBHOOK_ENQUEUE_TIMEOUT", 5))
+UPDATE_WORKERS = int(os.getenv("UPDATE_WORKERS", 8))
+UPDATE_QUEUE_SIZE = int(os.getenv("UPDATE_QUEUE_SIZE", 1000))
+
+KEYSPACE_EPOCH_REFRESH = float(os.getenv("KEYSPACE_EPOCH_REFRESH", 5))
+# Ключи старого поколения удаляются не раньше, чем через столько секунд после смены;
+# должно быть заметно больше KEYSPACE_EPOCH_REFRESH во всех сервисах
+KEYSPACE_CLEANUP_GRACE = float(os.getenv("KEYSPACE_CLEANUP_GRACE", 60))
+RESET_KEYSPACE_ON_STARTUP = os.getenv("RESET_KEYSPACE_ON_STARTUP", "0") == "1"
+
+# Колода анкет: сколько следующих карточек держать готовыми для каждого пользователя
+DECK_SIZE = int(os.getenv("DECK_SIZE", 5))
+DECK_REFILL_THRESHOLD = int(os.getenv("DECK_REFILL_THRESHOLD", 2))
+DECK_TTL = int(os.getenv("DECK_TTL", 60 * 10))
+DECK_MAX_USERS = int(os.getenv("DECK_MAX_USERS", 10000))
+
+# Очередь уведомлений: лимиты Telegram - около 30 сообщений в секунду всего и 1 в секунду в один чат
+NOTIFY_GLOBAL_RATE = float(os.getenv("NOTIFY_GLOBAL_RATE", 25))
+NOTIFY_CHAT_RATE = float(os.getenv("NOTIFY_CHAT_RATE", 1))
+NOTIFY_BATCH_SIZE = int(os.getenv("NOTIFY_BATCH_SIZE", 50))
+NOTIFY_MAX_ATTEMPTS = int(os.getenv("NOTIFY_MAX_ATTEMPTS", 5))
+
+# Геокодирование: офлайн-справочник городов, кэш и Nominatim как последний вариант
+GEOCODE_MAX_CITY_DISTANCE_KM = float(os.getenv("GEOCODE_MAX_CITY_DISTANCE_KM", 50))
+GEOCODE_CACHE_TTL = int(os.getenv("GEOCODE_CACHE_TTL", 60 * 60 * 24 * 30))
+GEOCODE_LRU_SIZE = int(os.getenv("GEOCODE_LRU_SIZE", 10000))
+GEOCODE_REMOTE_ENABLED = os.getenv("GEOCODE_REMOTE_ENABLED", "1") == "1"
+GEOCODE_REMOTE_TIMEOUT = float(os.getenv("GEOCODE_REMOTE_TIMEOUT", 2))
+NOMINATIM_URL = os.getenv("NOMINATIM_URL", "https://nominatim.openstreetmap.org/reverse")
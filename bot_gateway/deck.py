@@ -0,0 +1,103 @@
+import time
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from config import DECK_SIZE, DECK_REFILL_THRESHOLD, DECK_TTL, DECK_MAX_USERS
+from clients import matchmaking_client, ServiceError
+from media import object_name_from_url, cached_file_ids
+from images import card_object_name
+
+logger = logging.getLogger(__name__)
+
+
+class Card:
+    """
+    Анкета, готовая к отправке: текст, объекты фото и их file_id из кэша Telegram.
+    Содержимое фото в колоде не хранится: объекты без file_id читаются из MinIO при отправке.
+    """
+
+    def __init__(self, profile, object_names, file_ids):
+        self.profile = profile
+        self.user_id = profile["user_id"]
+        self.text = f"<b>{profile['name']}, {profile['age']}</b>\n📍 {profile['city']}"
+        self.object_names = object_names
+        self.file_ids = file_ids
+        self.created_at = time.monotonic()
+
+
+async def prepare_card(profile):
+    object_names = [card_object_name(object_name_from_url(url)) for url in profile["photos"]]
+    return Card(profile, object_names, await cached_file_ids(object_names))
+
+
+class SwipeDeck:
+    """
+    Колоды следующих анкет для пользователей этого процесса.
+
+    Апдейты одного чата всегда обрабатывает один процесс шлюза, поэтому колоды хранятся
+    в памяти. Когда в колоде остаётся DECK_REFILL_THRESHOLD карточек, в фоне
+    запрашиваются новые кандидаты с анкетами и file_id фото, так что после голоса
+    следующая карточка сразу уходит в Telegram.
+
+    Кандидаты берутся без отметки о показе: её ставит отправка карточки. Карточки,
+    потерянные при истечении DECK_TTL, вытеснении или перезапуске, остаются непоказанными
+    и вернутся в выдачу.
+    """
+
+    def __init__(self, size=DECK_SIZE, refill_threshold=DECK_REFILL_THRESHOLD, ttl=DECK_TTL, max_users=DECK_MAX_USERS):
+        self.size = size
+        self.refill_threshold = refill_threshold
+        self.ttl = ttl
+        self.max_users = max_users
+        self.decks = OrderedDict()
+        self.refills = {}
+
+    def _deck(self, user_id):
+        deck = self.decks.get(user_id)
+        if deck is None:
+            deck = self.decks[user_id] = deque()
+            while len(self.decks) > self.max_users:
+                self.decks.popitem(last=False)
+        self.decks.move_to_end(user_id)
+        return deck
+
+    async def _refill(self, user_id):
+        deck = self._deck(user_id)
+        missing = self.size - len(deck)
+        if missing <= 0:
+            return
+        try:
+            profiles = await matchmaking_client.match(user_id, limit=missing, mark_seen=False)
+            cards = await asyncio.gather(*(prepare_card(p) for p in profiles))
+        except ServiceError as e:
+            logger.warning(f"❌ Не удалось пополнить колоду {user_id}: {e}")
+            return
+        seen = {card.user_id for card in deck}
+        deck.extend(card for card in cards if card.user_id not in seen)
+
+    def refill(self, user_id):
+        """Запускает пополнение колоды, если оно ещё не идёт. Возвращает задачу пополнения."""
+        task = self.refills.get(user_id)
+        if task is None:
+            task = self.refills[user_id] = asyncio.create_task(self._refill(user_id))
+            task.add_done_callback(lambda _: self.refills.pop(user_id, None))
+        return task
+
+    async def pop(self, user_id):
+        """Возвращает следующую карточку или None, если кандидатов больше нет."""
+        deck = self._deck(user_id)
+        now = time.monotonic()
+        while deck and now - deck[0].created_at > self.ttl:
+            deck.popleft()
+        if not deck:
+            await self.refill(user_id)
+
+        if not deck:
+            return None
+        card = deck.popleft()
+        if len(deck) <= self.refill_threshold:
+            self.refill(user_id)
+        return card
+
+
+swipe_deck = SwipeDeck()
@@ -0,0 +1,126 @@
+import os
+import csv
+import math
+import asyncio
+import logging
+from collections import OrderedDict, defaultdict
+import aiohttp
+from config import (
+    r, GEOCODE_MAX_CITY_DISTANCE_KM, GEOCODE_CACHE_TTL, GEOCODE_LRU_SIZE,
+    GEOCODE_REMOTE_ENABLED, GEOCODE_REMOTE_TIMEOUT, NOMINATIM_URL,
+)
+from clients import get_session
+
+logger = logging.getLogger(__name__)
+
+CITIES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "cities.csv")
+# Координаты округляются до 0.01° (около 1 км): все точки ячейки делят одну запись кэша
+CACHE_PRECISION = 2
+# Отрицательный результат кэшируется ненадолго, чтобы повторить запрос позже
+MISS_CACHE_TTL = 60 * 60
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.2
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class CityIndex:
+    """Справочник городов в сетке ячеек 1°x1°: поиск ближайшего смотрит только соседние ячейки."""
+
+    def __init__(self, cities):
+        self.cells = defaultdict(list)
+        for name, lat, lon in cities:
+            self.cells[(math.floor(lat), math.floor(lon))].append((name, lat, lon))
+
+    @classmethod
+    def from_csv(cls, path=CITIES_PATH):
+        with open(path, encoding="utf-8") as f:
+            return cls([(row["name"], float(row["latitude"]), float(row["longitude"])) for row in csv.DictReader(f)])
+
+    def nearest(self, lat, lon, max_distance_km=GEOCODE_MAX_CITY_DISTANCE_KM):
+        lat_cells = math.ceil(max_distance_km / KM_PER_DEGREE)
+        # Градус долготы сужается к полюсам, поэтому по долготе просматривается больше ячеек
+        lon_cells = min(180, math.ceil(max_distance_km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01))))
+        cell_lat, cell_lon = math.floor(lat), math.floor(lon)
+
+        best, best_distance = None, max_distance_km
+        for i in range(cell_lat - lat_cells, cell_lat + lat_cells + 1):
+            for j in range(cell_lon - lon_cells, cell_lon + lon_cells + 1):
+                for name, city_lat, city_lon in self.cells.get((i, (j + 180) % 360 - 180), ()):
+                    distance = haversine_km(lat, lon, city_lat, city_lon)
+                    if distance <= best_distance:
+                        best, best_distance = name, distance
+        return best
+
+
+class Geocoder:
+    """
+    Определение города по координатам без обязательного похода во внешний сервис.
+
+    Порядок поиска: LRU в памяти процесса, общий кэш в Redis по округлённым координатам,
+    ближайший город из встроенного справочника и только потом Nominatim со строгим
+    таймаутом. Найденный результат сохраняется в оба кэша, а промах - только в Redis
+    на MISS_CACHE_TTL, чтобы по истечении срока ячейку проверили заново.
+    """
+
+    def __init__(self, r, index, lru_size=GEOCODE_LRU_SIZE):
+        self.r = r
+        self.index = index
+        self.lru_size = lru_size
+        self.lru = OrderedDict()
+
+    def _cell(self, lat, lon):
+        return f"{lat:.{CACHE_PRECISION}f}:{lon:.{CACHE_PRECISION}f}"
+
+    def _remember_local(self, cell, city):
+        self.lru[cell] = city
+        self.lru.move_to_end(cell)
+        if len(self.lru) > self.lru_size:
+            self.lru.popitem(last=False)
+
+    async def city(self, lat, lon):
+        """Возвращает название города или None, если его не удалось определить."""
+        cell = self._cell(lat, lon)
+        if cell in self.lru:
+            self.lru.move_to_end(cell)
+            return self.lru[cell]
+
+        cache_key = f"geocode:{cell}"
+        city = await self.r.get(cache_key)
+        if city is None:
+            city = self.index.nearest(lat, lon)
+            if city is None and GEOCODE_REMOTE_ENABLED:
+                city = await self._remote(lat, lon)
+            await self.r.set(cache_key, city or "", ex=GEOCODE_CACHE_TTL if city else MISS_CACHE_TTL)
+
+        if not city:
+            return None
+        self._remember_local(cell, city)
+        return city
+
+    async def _remote(self, lat, lon):
+        params = {"format": "json", "lat": lat, "lon": lon, "zoom": 10, "accept-language": "ru"}
+        try:
+            async with get_session().get(
+                NOMINATIM_URL,
+                params=params,
+                headers={"User-Agent": "DatingBot/1.0"},
+                timeout=aiohttp.ClientTimeout(total=GEOCODE_REMOTE_TIMEOUT),
+            ) as resp:
+                if resp.status != 200:
+                    return None
+                data = await resp.json()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"❌ Nominatim недоступен: {e}")
+            return None
+        address = data.get("address", {})
+        return address.get("city") or address.get("town") or address.get("village")
+
+
+geocoder = Geocoder(r, CityIndex.from_csv())
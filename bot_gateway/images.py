@@ -0,0 +1,40 @@
+import re
+import hashlib
+from io import BytesIO
+from PIL import Image, ImageOps
+from config import PHOTO_MAX_SIDE, PHOTO_PREVIEW_SIDE, PHOTO_JPEG_QUALITY
+
+PREVIEW_SUFFIX = "_preview"
+_HASHED_NAME = re.compile(r"^[0-9a-f]{64}\.jpg$")
+
+
+def content_object_name(content):
+    """Имя объекта по хэшу содержимого: одинаковые фото хранятся в MinIO один раз."""
+    return f"{hashlib.sha256(content).hexdigest()}.jpg"
+
+
+def preview_object_name(object_name):
+    """Имя уменьшенной копии. Для фото, загруженных до появления превью, возвращает None."""
+    if not _HASHED_NAME.match(object_name):
+        return None
+    return object_name.replace(".jpg", f"{PREVIEW_SUFFIX}.jpg")
+
+
+def card_object_name(object_name):
+    return preview_object_name(object_name) or object_name
+
+
+def _encode(image, max_side):
+    image = image.copy()
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    out = BytesIO()
+    # Сохраняем без exif/icc: метаданные (в том числе геотеги) в хранилище не попадают
+    image.save(out, format="JPEG", quality=PHOTO_JPEG_QUALITY, optimize=True, progressive=True)
+    return out.getvalue()
+
+
+def normalize_image(content):
+    """Перекодирует фото в JPEG ограниченного размера и строит превью. Возвращает (full, preview)."""
+    with Image.open(BytesIO(content)) as image:
+        image = ImageOps.exif_transpose(image).convert("RGB")
+    return _encode(image, PHOTO_MAX_SIDE), _encode(image, PHOTO_PREVIEW_SIDE)
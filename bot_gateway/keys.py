@@ -0,0 +1,99 @@
+import asyncio
+import logging
+from config import r, KEYSPACE_EPOCH_REFRESH, KEYSPACE_CLEANUP_GRACE
+
+logger = logging.getLogger(__name__)
+
+EPOCH_KEY = "keyspace:epoch"
+# Старые поколения с временем смены (по часам Redis), после которой их можно удалять
+RETIRED_EPOCHS_KEY = "keyspace:retired_epochs"
+LEGACY_REMOVED_KEY = "keyspace:legacy_removed"
+# Ключи, которые жили без префикса поколения до его появления
+LEGACY_PATTERNS = ("votes:*", "liked_by:*", "shown_user_ids:*")
+CLEANUP_SCAN_COUNT = 1000
+
+# Переход на новое поколение ключей: O(1) вместо удаления каждого ключа
+BUMP_EPOCH_LUA = """
+local epoch = redis.call('INCR', KEYS[1])
+local now = redis.call('TIME')
+redis.call('ZADD', KEYS[2], tonumber(now[1]), epoch - 1)
+return epoch
+"""
+
+
+class KeySpace:
+    """
+    Пространство ключей пользовательских данных (голоса, лайки, мэтчи, показанные анкеты)
+    с префиксом поколения e{epoch}:. Сброс данных - это смена поколения; ключи старых
+    поколений удаляются в фоне.
+
+    Сервисы кэшируют номер поколения до KEYSPACE_EPOCH_REFRESH секунд и всё это время могут
+    писать в старое, поэтому его ключи удаляются не раньше чем через KEYSPACE_CLEANUP_GRACE
+    секунд после смены.
+    """
+
+    def __init__(self, r):
+        self.r = r
+        self.bump_script = r.register_script(BUMP_EPOCH_LUA)
+        self._epoch = None
+        self._fetched_at = 0.0
+
+    async def epoch(self):
+        now = asyncio.get_running_loop().time()
+        if self._epoch is None or now - self._fetched_at > KEYSPACE_EPOCH_REFRESH:
+            self._epoch = int(await self.r.get(EPOCH_KEY) or 0)
+            self._fetched_at = now
+        return self._epoch
+
+    async def key(self, *parts):
+        return ":".join([f"e{await self.epoch()}", *map(str, parts)])
+
+    async def bump(self):
+        self._epoch = int(await self.bump_script(keys=[EPOCH_KEY, RETIRED_EPOCHS_KEY]))
+        self._fetched_at = asyncio.get_running_loop().time()
+        return self._epoch
+
+    async def cleanup_old_generations(self):
+        """
+        Удаляет ключи старых поколений и ключи без префикса из версий до поколений
+        пачками UNLINK, не блокируя Redis и старт шлюза.
+        """
+        if not await self.r.exists(LEGACY_REMOVED_KEY):
+            for pattern in LEGACY_PATTERNS:
+                removed = await self._unlink_matching(pattern)
+                logger.info("Удалено ключей %s без поколения: %s", pattern, removed)
+            await self.r.set(LEGACY_REMOVED_KEY, 1)
+
+        while retired := await self.r.zrange(RETIRED_EPOCHS_KEY, 0, -1, withscores=True):
+            now, _ = await self.r.time()
+            wait = retired[0][1] + KEYSPACE_CLEANUP_GRACE - now
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            for epoch, retired_at in retired:
+                if retired_at + KEYSPACE_CLEANUP_GRACE > now:
+                    break
+                removed = await self._unlink_matching(f"e{epoch}:*")
+                await self.r.zrem(RETIRED_EPOCHS_KEY, epoch)
+                logger.info("Удалено ключей поколения %s: %s", epoch, removed)
+
+    async def _unlink_matching(self, pattern):
+        removed = 0
+        batch = []
+        async for key in self.r.scan_iter(match=pattern, count=CLEANUP_SCAN_COUNT):
+            batch.append(key)
+            if len(batch) >= CLEANUP_SCAN_COUNT:
+                removed += await self._unlink(batch)
+                batch = []
+        return removed + await self._unlink(batch)
+
+    async def _unlink(self, keys):
+        if not keys:
+            return 0
+        pipe = self.r.pipeline(transaction=False)
+        for i in range(0, len(keys), 100):
+            pipe.unlink(*keys[i:i + 100])
+        return sum(await pipe.execute())
+
+
+keyspace = KeySpace(r)
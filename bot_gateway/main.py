@@ -1,33 +1,43 @@
 import os
-import time
 import asyncio
 import logging
-import aiohttp
-import tempfile
-from collections import defaultdict
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request
 from aiogram import Bot, Dispatcher, Router, F
 from aiogram.enums import ParseMode
 from aiogram.filters import Command
 from aiogram.types import (
-    FSInputFile, Message, InputMediaPhoto,
-    KeyboardButton, ReplyKeyboardMarkup, ReplyKeyboardRemove
+    Message, Update, KeyboardButton, ReplyKeyboardMarkup, ReplyKeyboardRemove
 )
-from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.fsm.storage.redis import RedisStorage
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.context import FSMContext
-from config import minio_client, BUCKET_NAME, MINIO_PUBLIC_URL, r
+from config import (
+    BUCKET_NAME, MINIO_PUBLIC_URL, r,
+    ALBUM_DEBOUNCE, MAX_PROFILE_PHOTOS, PHOTO_UPLOAD_CONCURRENCY,
+    FSM_TTL, GATEWAY_SHARDS, RESET_KEYSPACE_ON_STARTUP,
+    UPDATE_MODE, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_ENQUEUE_TIMEOUT
+)
 from matching_handlers import get_router as get_match_router
-from like_handlers import get_like_router
-from io import BytesIO
+from clients import get_session, close_session, user_client, rating_client, ServiceError
+from media import object_name_from_url, remember_file_ids, send_profile_photos
+from storage import put_object, object_exists
+from images import content_object_name, preview_object_name, normalize_image
+from albums import MediaGroupCollector
+from keys import keyspace
+from notifications import NotificationSender
+from geocoding import geocoder
+from updates import UpdateQueue, poll_updates, publish_update, owned_shards, acquire_shards, run_sharded
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN", "fake")
 bot = Bot(token=TELEGRAM_TOKEN, parse_mode=ParseMode.HTML)
-dp = Dispatcher(storage=MemoryStorage())
+dp = Dispatcher(storage=RedisStorage(redis=r, state_ttl=FSM_TTL, data_ttl=FSM_TTL))
 router = Router()
-media_groups = defaultdict(list)
+media_groups = MediaGroupCollector(r, debounce=ALBUM_DEBOUNCE, max_items=MAX_PROFILE_PHOTOS)
+upload_semaphore = asyncio.Semaphore(PHOTO_UPLOAD_CONCURRENCY)
+update_queue = UpdateQueue()
+album_tasks = set()
 
 class ProfileFSM(StatesGroup):
     name = State()
@@ -77,7 +87,7 @@ async def handle_interests(message: Message, state: FSMContext):
     if message.text.lower() == "пропустить":
         interests = []
     else:
-        interests = [i.strip() for i in message.text.split(",")]
+        interests = [i.strip() for i in message.text.split(",") if i.strip()]
     await state.update_data(interests=interests)
     kb = ReplyKeyboardMarkup(
         keyboard=[
@@ -92,17 +102,13 @@ async def handle_interests(message: Message, state: FSMContext):
 @router.message(ProfileFSM.city_or_geo, F.location)
 async def handle_location(message: Message, state: FSMContext):
     lat, lon = message.location.latitude, message.location.longitude
-    url = f"https://nominatim.openstreetmap.org/reverse?format=json&lat={lat}&lon={lon}"
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as resp:
-            data = await resp.json()
-    city = data.get("address", {}).get("city") or data.get("address", {}).get("town") or data.get("address", {}).get("village")
+    city = await geocoder.city(lat, lon)
     if not city:
         await message.answer("Не удалось определить город. Введи его вручную.")
         await state.set_state(ProfileFSM.city)
         return
     await state.update_data(city=city, latitude=lat, longitude=lon)
-    await message.answer("Отправь 1–3 фото профиля", reply_markup=ReplyKeyboardRemove())
+    await message.answer(f"Отправь 1–{MAX_PROFILE_PHOTOS} фото профиля", reply_markup=ReplyKeyboardRemove())
     await state.set_state(ProfileFSM.photos)
 
 @router.message(ProfileFSM.city_or_geo, F.text)
@@ -116,72 +122,62 @@ async def ask_manual_city(message: Message, state: FSMContext):
 @router.message(ProfileFSM.city)
 async def handle_manual_city(message: Message, state: FSMContext):
     await state.update_data(city=message.text, latitude=55.75, longitude=37.61)
-    await message.answer("Отправь 1–3 фото профиля")
+    await message.answer(f"Отправь 1–{MAX_PROFILE_PHOTOS} фото профиля")
     await state.set_state(ProfileFSM.photos)
 
+async def upload_photo(file_id):
+    async with upload_semaphore:
+        tg_file = await bot.get_file(file_id)
+        url = f"https://api.telegram.org/file/bot{TELEGRAM_TOKEN}/{tg_file.file_path}"
+        async with get_session().get(url) as resp:
+            content = await resp.read()
+
+        object_name = content_object_name(content)
+        if not await object_exists(object_name):
+            full, preview = await asyncio.to_thread(normalize_image, content)
+            # Превью кладём первым: наличие полного объекта означает, что готовы оба
+            await put_object(preview_object_name(object_name), preview)
+            await put_object(object_name, full)
+        await remember_file_ids({object_name: file_id})
+        return object_name
+
 @router.message(ProfileFSM.photos, F.photo)
 async def handle_photos(message: Message, state: FSMContext):
-    user_id = message.from_user.id
-    media_group_id = message.media_group_id
-    if media_group_id:
-        media_groups[(user_id, media_group_id)].append(message.photo[-1].file_id)
-        await asyncio.sleep(2.5) 
-
-        file_ids = media_groups.pop((user_id, media_group_id), [])
-        if not file_ids:
-            await message.answer("❌ Не удалось обработать фото.")
-            return
-
-        photos = []
-        for file_id in file_ids:
-            tg_file = await bot.get_file(file_id)
-            url = f"https://api.telegram.org/file/bot{TELEGRAM_TOKEN}/{tg_file.file_path}"
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as resp:
-                    content = await resp.read()
-
-            object_name = f"{user_id}_{int(time.time() * 1000)}.jpg"
-            minio_client.put_object(
-                bucket_name=BUCKET_NAME,
-                object_name=object_name,
-                data=BytesIO(content),
-                length=len(content),
-                content_type="image/jpeg"
-            )
-            photos.append(object_name)
-
-        await state.update_data(photos=photos)
-        await state.set_state(ProfileFSM.preview)
-        await message.answer("📸 Фото загружены. Нажми '✅ Всё верно' или '🔄 Заполнить заново'.", reply_markup=ReplyKeyboardMarkup(
-            keyboard=[[KeyboardButton(text="✅ Всё верно")], [KeyboardButton(text="🔄 Заполнить заново")]],
-            resize_keyboard=True
+    file_id = message.photo[-1].file_id
+    if not message.media_group_id:
+        await save_photos(message, state, [file_id])
+        return
+
+    key = f"{message.from_user.id}:{message.media_group_id}"
+    if await media_groups.add(key, file_id):
+        # Альбом дособирается в фоне: обработчик не держит воркер чата, пока приходят остальные части
+        task = asyncio.create_task(finish_album(message, state, key))
+        album_tasks.add(task)
+        task.add_done_callback(album_tasks.discard)
+
+async def finish_album(message: Message, state: FSMContext, key):
+    try:
+        await save_photos(message, state, await media_groups.wait_complete(key))
+    except Exception:
+        logger.exception("Ошибка при сборке альбома %s", key)
+
+async def save_photos(message: Message, state: FSMContext, file_ids):
+    try:
+        photos = await asyncio.gather(*(
+            upload_photo(fid) for fid in file_ids
         ))
-    else:
-        try:
-            file_id = message.photo[-1].file_id
-            tg_file = await bot.get_file(file_id)
-            url = f"https://api.telegram.org/file/bot{TELEGRAM_TOKEN}/{tg_file.file_path}"
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as resp:
-                    content = await resp.read()
-
-            object_name = f"{user_id}_{int(time.time() * 1000)}.jpg"
-            minio_client.put_object(
-                bucket_name=BUCKET_NAME,
-                object_name=object_name,
-                data=BytesIO(content),
-                length=len(content),
-                content_type="image/jpeg"
-            )
-            await state.update_data(photos=[object_name])
-            await state.set_state(ProfileFSM.preview)
-            await message.answer("📸 Фото загружено. Нажми '✅ Всё верно' или '🔄 Заполнить заново'.", reply_markup=ReplyKeyboardMarkup(
-                keyboard=[[KeyboardButton(text="✅ Всё верно")], [KeyboardButton(text="🔄 Заполнить заново")]],
-                resize_keyboard=True
-            ))
-        except Exception as e:
-            logger.exception("Ошибка при загрузке фото")
-            await message.answer(f"❌ Не удалось загрузить фото: {e}")
+    except Exception as e:
+        logger.exception("Ошибка при загрузке фото")
+        await message.answer(f"❌ Не удалось загрузить фото: {e}")
+        return
+
+    await state.update_data(photos=list(photos))
+    await state.set_state(ProfileFSM.preview)
+    done_text = "📸 Фото загружены." if len(photos) > 1 else "📸 Фото загружено."
+    await message.answer(f"{done_text} Нажми '✅ Всё верно' или '🔄 Заполнить заново'.", reply_markup=ReplyKeyboardMarkup(
+        keyboard=[[KeyboardButton(text="✅ Всё верно")], [KeyboardButton(text="🔄 Заполнить заново")]],
+        resize_keyboard=True
+    ))
 
 @router.message(ProfileFSM.preview, F.text)
 async def handle_preview_response(message: Message, state: FSMContext):
@@ -203,15 +199,13 @@ async def handle_preview_response(message: Message, state: FSMContext):
             "username": message.from_user.username
         }
 
-        async with aiohttp.ClientSession() as session:
-            await session.post("http://user_service:8000/profile", json=profile)
-            try:
-                async with session.post("http://rating_service:8000/rate", json=profile) as resp:
-                    rating_data = await resp.json()
-                    profile["rating"] = rating_data.get("rating")
-            except Exception as e:
-                logger.warning(f"❌ Не удалось получить рейтинг: {e}")
-                profile["rating"] = None
+        await user_client.save_profile(profile)
+        try:
+            rating_data = await rating_client.rate(profile) or {}
+            profile["rating"] = rating_data.get("rating")
+        except ServiceError as e:
+            logger.warning(f"❌ Не удалось получить рейтинг: {e}")
+            profile["rating"] = None
 
         kb = ReplyKeyboardMarkup(
             keyboard=[[KeyboardButton(text="📄 Мой профиль")], [KeyboardButton(text="💘 Начать поиск")]],
@@ -239,43 +233,21 @@ async def show_preview(message: Message, data: dict):
     if rating is not None:
         caption += f"\n⭐️ Рейтинг: {rating:.1f}"
 
-    media = []
-    for idx, object_name in enumerate(data['photos']):
-        file = minio_client.get_object(BUCKET_NAME, object_name)
-        content = file.read()
-        file.close()
-        file.release_conn()
-        tmp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".jpg")
-        tmp_file.write(content)
-        tmp_file.close()
-        input_file = FSInputFile(tmp_file.name)
-        if idx == 0:
-            media.append(InputMediaPhoto(media=input_file, caption=caption, parse_mode=ParseMode.HTML))
-        else:
-            media.append(InputMediaPhoto(media=input_file))
-
-    if len(media) > 1:
-        await bot.send_media_group(chat_id=message.chat.id, media=media)
-    else:
-        await bot.send_photo(chat_id=message.chat.id, photo=media[0].media, caption=caption, parse_mode=ParseMode.HTML)
+    await send_profile_photos(bot, message.chat.id, data['photos'], caption)
 
 @router.message(F.text == "📄 Мой профиль")
 @router.message(Command("myprofile"))
 async def show_my_profile(message: Message):
     user_id = str(message.from_user.id)
 
-    async with aiohttp.ClientSession() as session:
-        async with session.get(f"http://user_service:8000/profile/{user_id}") as resp:
-            if resp.status != 200:
-                await message.answer("❌ Анкета не найдена.")
-                return
-            profile = await resp.json()
-        try:
-            async with session.post("http://rating_service:8000/rate", json=profile) as resp:
-                rating_data = await resp.json()
-                rating = rating_data.get("rating")
-        except Exception:
-            rating = None
+    profile = await user_client.get_profile(user_id)
+    if not profile:
+        await message.answer("❌ Анкета не найдена.")
+        return
+    try:
+        rating = await rating_client.get_rating(user_id)
+    except ServiceError:
+        rating = None
 
     gender_icon = "👨" if profile["gender"] == "male" else "👩"
     interests = ', '.join(profile["interests"]) if profile["interests"] else "—"
@@ -290,42 +262,55 @@ async def show_my_profile(message: Message):
     if rating is not None:
         caption += f"\n⭐️ Рейтинг: {rating:.1f}"
 
-    media = []
-    for idx, photo_url in enumerate(profile["photos"]):
-        object_name = photo_url.rsplit("/", 1)[-1]
-        response = minio_client.get_object(BUCKET_NAME, object_name)
-        content = response.read()
-        response.close()
-        response.release_conn()
-        with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as tmp:
-            tmp.write(content)
-            tmp_path = tmp.name
-        file = FSInputFile(tmp_path)
-        if idx == 0:
-            media.append(InputMediaPhoto(media=file, caption=caption, parse_mode="HTML"))
-        else:
-            media.append(InputMediaPhoto(media=file))
-
-    if media:
-        if len(media) > 1:
-            await bot.send_media_group(chat_id=message.chat.id, media=media)
-        else:
-            await message.answer_photo(media[0].media, caption=caption, parse_mode="HTML")
-    else:
-        await message.answer(caption, parse_mode="HTML")
+    object_names = [object_name_from_url(url) for url in profile["photos"]]
+    await send_profile_photos(bot, message.chat.id, object_names, caption)
 
 app = FastAPI()
 dp.include_router(router)
-dp.include_router(get_match_router(minio_client, BUCKET_NAME))
-dp.include_router(get_like_router())
+dp.include_router(get_match_router())
 
 @app.on_event("startup")
 async def on_startup():
-    for key in r.scan_iter("shown_user_ids:*"):
-        r.delete(key)
-    for key in r.scan_iter("votes:*"):
-        r.delete(key)
-    for key in r.scan_iter("liked_by:*"):
-        r.delete(key)
-    print("🧹 Redis очищен")
-    asyncio.create_task(dp.start_polling(bot))
+    if RESET_KEYSPACE_ON_STARTUP:
+        # Сброс - только смена поколения ключей; старые ключи удаляются в фоне
+        epoch = await keyspace.bump()
+        print(f"🧹 Данные пользователей сброшены, поколение ключей {epoch}")
+    asyncio.create_task(keyspace.cleanup_old_generations())
+    app.state.notifier = asyncio.create_task(NotificationSender(bot).run())
+    polling = UPDATE_MODE != "webhook"
+    if polling:
+        await bot.delete_webhook()
+    else:
+        await bot.set_webhook(f"{WEBHOOK_URL}{WEBHOOK_PATH}", secret_token=WEBHOOK_SECRET or None)
+
+    if GATEWAY_SHARDS:
+        # Аренду шардов берём до старта: если шарды заняты другой репликой, шлюз не поднимется
+        shards = owned_shards()
+        await acquire_shards(shards)
+        app.state.updates = asyncio.create_task(run_sharded(dp, bot, shards, polling=polling))
+    else:
+        update_queue.start(dp, bot)
+        if polling:
+            app.state.updates = asyncio.create_task(poll_updates(bot, update_queue.put))
+
+@app.post(WEBHOOK_PATH)
+async def telegram_webhook(request: Request):
+    if WEBHOOK_SECRET and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != WEBHOOK_SECRET:
+        raise HTTPException(status_code=403, detail="Invalid secret token")
+
+    update = Update(**await request.json())
+    if GATEWAY_SHARDS:
+        await publish_update(update)
+    elif not await update_queue.put(update, timeout=WEBHOOK_ENQUEUE_TIMEOUT):
+        # Очередь переполнена: Telegram повторит доставку позже
+        raise HTTPException(status_code=503, detail="Update queue is full")
+    return {"ok": True}
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    app.state.notifier.cancel()
+    if getattr(app.state, "updates", None):
+        app.state.updates.cancel()
+    await update_queue.stop()
+    await close_session()
+    await r.close()
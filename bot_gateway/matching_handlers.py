@@ -1,159 +1,127 @@
 import os
 import logging
-import aiohttp
-import tempfile
 from aiogram import Router, F, Bot
-from aiogram.types import Message, CallbackQuery, FSInputFile, InputMediaPhoto
+from aiogram.types import Message, CallbackQuery
 from aiogram.enums import ParseMode
 from config import r
+from keys import keyspace
 from keyboards.match import like_dislike_kb
 from keyboards.liked_back import liked_back_kb
+from clients import user_client, matchmaking_client, ServiceError
+from votes import record_vote, inbox_key, inbox_count, pop_liker, return_liker
+from media import send_profile_photos
+from deck import swipe_deck, prepare_card
+from notifications import enqueue_match
 
 logger = logging.getLogger(__name__)
+LIKERS_MAX_SKIPS = 10
 bot = Bot(token=os.getenv("TELEGRAM_TOKEN", "fake"), parse_mode=ParseMode.HTML)
 
-def get_router(minio_client, bucket_name):
+async def send_card(user_id, chat_id, card):
+    """
+    Отправляет карточку с кнопками голосования и отмечает анкету показанной.
+    Для анкеты с одним фото это один запрос к Telegram.
+    """
+    if len(card.object_names) <= 1:
+        msgs = await send_profile_photos(
+            bot, chat_id, card.object_names, card.text, reply_markup=like_dislike_kb(), file_ids=card.file_ids
+        )
+        buttons_msg = msgs[0]
+    else:
+        await send_profile_photos(bot, chat_id, card.object_names, card.text, file_ids=card.file_ids)
+        buttons_msg = await bot.send_message(
+            chat_id=chat_id,
+            text="👍 Лайк или 👎 Дизлайк?",
+            reply_markup=like_dislike_kb()
+        )
+    await r.set(f"match_message:{buttons_msg.message_id}", card.user_id)
+    try:
+        await matchmaking_client.mark_seen(user_id, [card.user_id])
+    except ServiceError as e:
+        logger.warning(f"❌ Не удалось отметить анкету {card.user_id} показанной: {e}")
+
+def get_router():
     router = Router()
 
     @router.message(F.text == "💘 Начать поиск")
     async def show_match(message: Message):
         user_id = message.from_user.id
-        user_votes = r.hkeys(f"votes:{user_id}")
-        liked_by = r.lrange(f"liked_by:{user_id}", 0, -1)
+        pipe = r.pipeline(transaction=False)
+        pipe.hlen(await keyspace.key("votes", user_id))
+        pipe.zcard(await inbox_key(user_id))
+        votes_count, liked_count = await pipe.execute()
 
-        if not user_votes and liked_by:
+        if not votes_count and liked_count:
             await message.answer(
-                f"Вашу анкету лайкнули {len(liked_by)} человек(а). Хотите посмотреть?",
+                f"Вашу анкету лайкнули {liked_count} человек(а). Хотите посмотреть?",
                 reply_markup=liked_back_kb()
             )
             return
 
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f"http://matchmaking_service:8000/match?user_id={user_id}") as resp:
-                profiles = await resp.json()
+        card = await swipe_deck.pop(user_id)
 
-        if not profiles:
-            if liked_by:
+        if not card:
+            if liked_count:
                 await message.answer(
-                    f"Вашу анкету лайкнули {len(liked_by)} человек(а). Хотите посмотреть?",
+                    f"Вашу анкету лайкнули {liked_count} человек(а). Хотите посмотреть?",
                     reply_markup=liked_back_kb()
                 )
             else:
                 await message.answer("Нет новых анкет 😔")
             return
 
-        profile = profiles[0]
-        text = (
-            f"<b>{profile['name']}, {profile['age']}</b>\n"
-            f"📍 {profile['city']}"
-        )
-
-        media = []
-        for idx, photo_url in enumerate(profile["photos"]):
-            object_name = photo_url.rsplit("/", 1)[-1]
-            resp = minio_client.get_object(bucket_name, object_name)
-            content = resp.read()
-            with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as tmp:
-                tmp.write(content)
-                tmp_path = tmp.name
-            input_file = FSInputFile(tmp_path)
-            if idx == 0:
-                media.append(InputMediaPhoto(media=input_file, caption=text, parse_mode="HTML"))
-            else:
-                media.append(InputMediaPhoto(media=input_file))
-
-        msgs = await bot.send_media_group(chat_id=message.chat.id, media=media)
-
-        buttons_msg = await bot.send_message(
-            chat_id=message.chat.id,
-            text="👍 Лайк или 👎 Дизлайк?",
-            reply_markup=like_dislike_kb()
-        )
-
-        r.set(f"match_message:{buttons_msg.message_id}", profile["user_id"])
+        await send_card(user_id, message.chat.id, card)
 
     @router.callback_query(F.data.in_({"like", "dislike"}))
     async def handle_vote(callback: CallbackQuery):
         user_id = callback.from_user.id
         message_id = callback.message.message_id
-        liked_user_id = r.get(f"match_message:{message_id}")
+        liked_user_id = await r.get(f"match_message:{message_id}")
 
         if not liked_user_id:
             await callback.answer("❌ Не удалось определить анкету")
             return
 
         vote = callback.data
-        key = f"votes:{user_id}"
-        r.hset(key, liked_user_id, vote)
-
-        if vote == "like":
-            r.rpush(f"liked_by:{liked_user_id}", user_id)
-            if r.hget(f"votes:{liked_user_id}", str(user_id)) == "like":
-                try:
-                    async with aiohttp.ClientSession() as session:
-                        async with session.get(f"http://user_service:8000/profile/{liked_user_id}") as resp:
-                            if resp.status == 200:
-                                profile = await resp.json()
-                                username = profile.get("username")
-                                contact = f"https://t.me/{username}" if username else f"ID: {liked_user_id}"
-                            else:
-                                contact = f"ID: {liked_user_id}"
-                except Exception:
-                    contact = f"ID: {liked_user_id}"
-
-                await bot.send_message(
-                    user_id,
-                    f"🎉 У вас мэтч с пользователем!\nСвяжитесь: {contact}"
-                )
-                await bot.send_message(
-                    liked_user_id,
-                    f"🎉 У вас мэтч с пользователем!\nСвяжитесь: https://t.me/{callback.from_user.username}" if callback.from_user.username else f"ID: {user_id}"
-                )
-
+        if await record_vote(user_id, liked_user_id, vote):
+            # Уведомления о мэтче уходят через очередь и не задерживают ответ на голос
+            await enqueue_match(user_id, callback.from_user.username, liked_user_id)
         await callback.answer("👍 Голос учтён")
+
+        # Следующая карточка уже подготовлена колодой: отправляем её сразу после записи голоса
+        card = await swipe_deck.pop(user_id)
+        if card:
+            await send_card(user_id, callback.message.chat.id, card)
+        else:
+            await bot.send_message(callback.message.chat.id, "Нет новых анкет 😔")
         await callback.message.delete()
 
     @router.callback_query(F.data == "view_likers")
     async def handle_view_likers(callback: CallbackQuery):
         user_id = callback.from_user.id
-        liked_by = r.lrange(f"liked_by:{user_id}", 0, -1)
-
-        if not liked_by:
-            await callback.message.edit_text("На данный момент вас никто не лайкал.")
-            return
-
-        next_user_id = liked_by.pop(0)
-        r.ltrim(f"liked_by:{user_id}", 1, -1)
-
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f"http://user_service:8000/profile/{next_user_id}") as resp:
-                if resp.status != 200:
-                    await callback.message.edit_text("❌ Не удалось загрузить анкету.")
-                    return
-                profile = await resp.json()
-
-        text = f"<b>{profile['name']}, {profile['age']}</b>\n📍 {profile['city']}"
-        media = []
-        for idx, photo_url in enumerate(profile["photos"]):
-            object_name = photo_url.rsplit("/", 1)[-1]
-            resp = minio_client.get_object(bucket_name, object_name)
-            content = resp.read()
-            with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as tmp:
-                tmp.write(content)
-                tmp_path = tmp.name
-            input_file = FSInputFile(tmp_path)
-            if idx == 0:
-                media.append(InputMediaPhoto(media=input_file, caption=text, parse_mode="HTML"))
+        # Забираем лайкнувших по одному и пропускаем тех, чьих анкет уже нет
+        profile = None
+        for _ in range(LIKERS_MAX_SKIPS):
+            liker_id = await pop_liker(user_id)
+            if liker_id is None:
+                break
+            try:
+                profile = await user_client.get_profile(liker_id)
+            except ServiceError as e:
+                logger.warning(f"❌ Не удалось загрузить анкету {liker_id}: {e}")
+                await return_liker(user_id, liker_id)
+                break
+            if profile:
+                break
+
+        if not profile:
+            if await inbox_count(user_id):
+                await callback.message.edit_text("❌ Не удалось загрузить анкету.")
             else:
-                media.append(InputMediaPhoto(media=input_file))
+                await callback.message.edit_text("На данный момент вас никто не лайкал.")
+            return
 
-        msgs = await bot.send_media_group(chat_id=callback.message.chat.id, media=media)
-        buttons_msg = await bot.send_message(
-            chat_id=callback.message.chat.id,
-            text="👍 Лайк или 👎 Дизлайк?",
-            reply_markup=like_dislike_kb()
-        )
-        r.set(f"match_message:{buttons_msg.message_id}", next_user_id)
+        await send_card(user_id, callback.message.chat.id, await prepare_card(profile))
         await callback.message.delete()
 
     @router.callback_query(F.data == "ignore_likers")
@@ -0,0 +1,84 @@
+import logging
+from aiogram.types import BufferedInputFile, InputMediaPhoto
+from aiogram.enums import ParseMode
+from config import r
+from storage import get_objects
+
+logger = logging.getLogger(__name__)
+
+FILE_ID_TTL = 60 * 60 * 24 * 30
+
+
+def file_id_key(object_name):
+    return f"tg_file_id:{object_name}"
+
+
+def object_name_from_url(photo_url):
+    return photo_url.rsplit("/", 1)[-1]
+
+
+async def remember_file_ids(file_ids):
+    """Сохраняет пары object_name -> file_id одним конвейером."""
+    if not file_ids:
+        return
+    pipe = r.pipeline(transaction=False)
+    for object_name, file_id in file_ids.items():
+        pipe.set(file_id_key(object_name), file_id, ex=FILE_ID_TTL)
+    await pipe.execute()
+
+
+async def cached_file_ids(object_names):
+    """file_id из кэша Telegram для каждого объекта или None."""
+    if not object_names:
+        return []
+    return await r.mget([file_id_key(name) for name in object_names])
+
+
+async def resolve_photos(object_names, cached=None):
+    """
+    Для каждого объекта возвращает file_id из кэша Telegram, а если его нет - содержимое из MinIO.
+    cached - заранее полученные file_id; объекты без них всё равно перепроверяются в кэше.
+    """
+    if not object_names:
+        return []
+    if cached is None or not all(cached):
+        cached = await cached_file_ids(object_names)
+    missing = [name for name, file_id in zip(object_names, cached) if not file_id]
+    contents = dict(zip(missing, await get_objects(missing)))
+    return [
+        file_id or BufferedInputFile(contents[name], filename=name)
+        for name, file_id in zip(object_names, cached)
+    ]
+
+
+async def send_profile_photos(bot, chat_id, object_names, caption, reply_markup=None, file_ids=None):
+    """
+    Отправляет фото анкеты и запоминает file_id, выданные Telegram, чтобы не загружать их повторно.
+    file_ids - file_id, полученные заранее через cached_file_ids.
+    """
+    photos = await resolve_photos(object_names, file_ids)
+    if not photos:
+        return [await bot.send_message(chat_id, caption, parse_mode=ParseMode.HTML, reply_markup=reply_markup)]
+
+    if len(photos) == 1:
+        msgs = [await bot.send_photo(
+            chat_id=chat_id,
+            photo=photos[0],
+            caption=caption,
+            parse_mode=ParseMode.HTML,
+            reply_markup=reply_markup,
+        )]
+    else:
+        media = [
+            InputMediaPhoto(media=photo, caption=caption, parse_mode=ParseMode.HTML) if idx == 0
+            else InputMediaPhoto(media=photo)
+            for idx, photo in enumerate(photos)
+        ]
+        msgs = await bot.send_media_group(chat_id=chat_id, media=media)
+
+    await remember_file_ids({
+        object_name: msg.photo[-1].file_id
+        for object_name, photo, msg in zip(object_names, photos, msgs)
+        if not isinstance(photo, str) and msg.photo
+    })
+    return msgs
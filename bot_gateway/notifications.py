@@ -0,0 +1,237 @@
+import time
+import socket
+import asyncio
+import logging
+from collections import OrderedDict, defaultdict
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter, TelegramForbiddenError, TelegramNetworkError, TelegramAPIError
+from config import r, NOTIFY_GLOBAL_RATE, NOTIFY_CHAT_RATE, NOTIFY_BATCH_SIZE, NOTIFY_MAX_ATTEMPTS
+from clients import user_client
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATIONS_STREAM = "notifications"
+# Стрим подрезается отправителем по XTRIM MINID до самого старого неподтверждённого сообщения.
+# MAXLEN при XADD - только аварийный потолок на случай, когда отправители не работают:
+# он на порядки больше любой рабочей очереди, иначе приблизительная обрезка срежет неотправленное
+NOTIFICATIONS_STREAM_MAXLEN = 1000000
+CONSUMER_GROUP = "notifier"
+METRICS_KEY = "notifications:metrics"
+# Сообщения, которые другой процесс взял и не подтвердил за это время, забирает себе этот процесс
+CLAIM_IDLE_MS = 60000
+# Как часто забирать зависшие сообщения и подрезать стрим, даже если новые сообщения идут без пауз
+MAINTENANCE_INTERVAL = 10
+CHAT_BUCKETS_LIMIT = 10000
+
+
+def match_text(contact_id, username):
+    contact = f"https://t.me/{username}" if username else f"ID: {contact_id}"
+    return f"🎉 У вас мэтч с пользователем!\nСвяжитесь: {contact}"
+
+
+async def enqueue(chat_id, text):
+    await r.xadd(NOTIFICATIONS_STREAM, {"chat_id": chat_id, "text": text}, maxlen=NOTIFICATIONS_STREAM_MAXLEN, approximate=True)
+
+
+async def enqueue_match(user_id, user_username, other_id):
+    """
+    Ставит в очередь уведомления о мэтче обоим пользователям. Контакт голосующего известен
+    сразу, а контакт второго участника отправитель запросит у user_service сам,
+    чтобы голосование не ждало этого запроса.
+    """
+    pipe = r.pipeline(transaction=False)
+    pipe.xadd(
+        NOTIFICATIONS_STREAM,
+        {"chat_id": user_id, "text": "", "match_with": other_id},
+        maxlen=NOTIFICATIONS_STREAM_MAXLEN,
+        approximate=True,
+    )
+    pipe.xadd(
+        NOTIFICATIONS_STREAM,
+        {"chat_id": other_id, "text": match_text(user_id, user_username)},
+        maxlen=NOTIFICATIONS_STREAM_MAXLEN,
+        approximate=True,
+    )
+    await pipe.execute()
+
+
+async def broadcast(chat_ids, text):
+    """Массовая рассылка: сообщения уходят через ту же очередь и те же лимиты."""
+    pipe = r.pipeline(transaction=False)
+    for chat_id in chat_ids:
+        pipe.xadd(NOTIFICATIONS_STREAM, {"chat_id": chat_id, "text": text}, maxlen=NOTIFICATIONS_STREAM_MAXLEN, approximate=True)
+    await pipe.execute()
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def delay(self):
+        """Забирает жетон и возвращает, сколько секунд нужно подождать до отправки."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        self.tokens -= 1
+        return max(0.0, -self.tokens / self.rate)
+
+    async def acquire(self):
+        delay = self.delay()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+class NotificationSender:
+    """
+    Отправитель уведомлений из стрима notifications.
+
+    Сообщения читаются пачками; внутри пачки чаты обслуживаются параллельно, а сообщения
+    одного чата - по порядку. Скорость ограничивают общий жетонный бакет и бакет на чат
+    (лимиты действуют на процесс, поэтому при нескольких отправителях их нужно делить).
+    На 429 отправитель ждёт retry_after, сетевые ошибки повторяются с задержкой.
+    Счётчики доставки копятся в хэше notifications:metrics.
+    Раз в MAINTENANCE_INTERVAL секунд отправитель забирает зависшие у других процессов
+    сообщения и подрезает стрим до самого старого неподтверждённого.
+    """
+
+    def __init__(self, bot: Bot, consumer=None):
+        self.bot = bot
+        self.consumer = consumer or socket.gethostname()
+        self.global_bucket = TokenBucket(NOTIFY_GLOBAL_RATE)
+        # Бакеты чатов в порядке последнего использования: при переполнении вытесняется
+        # самый давний, а не сбрасываются все, иначе активные чаты получили бы лишний жетон
+        self.chat_buckets = OrderedDict()
+        self.paused_until = 0.0
+        self.claim_cursor = "0-0"
+
+    def _chat_bucket(self, chat_id):
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self.chat_buckets) >= CHAT_BUCKETS_LIMIT:
+                self.chat_buckets.popitem(last=False)
+            bucket = self.chat_buckets[chat_id] = TokenBucket(NOTIFY_CHAT_RATE, capacity=1)
+        else:
+            self.chat_buckets.move_to_end(chat_id)
+        return bucket
+
+    async def _render(self, messages):
+        """
+        Подставляет контакты в уведомления о мэтче: анкеты всей пачки загружаются одним
+        запросом, и повторы отправки уже не ходят в user_service.
+        """
+        pending = [fields for _, fields in messages if not fields.get("text")]
+        if not pending:
+            return
+        profiles = await user_client.get_profiles({fields["match_with"] for fields in pending})
+        for fields in pending:
+            profile = profiles.get(fields["match_with"]) or {}
+            fields["text"] = match_text(fields["match_with"], profile.get("username"))
+
+    async def _send(self, fields, metrics):
+        chat_id = fields["chat_id"]
+        text = fields["text"]
+        for attempt in range(NOTIFY_MAX_ATTEMPTS):
+            if self.paused_until > time.monotonic():
+                await asyncio.sleep(self.paused_until - time.monotonic())
+            await self._chat_bucket(chat_id).acquire()
+            await self.global_bucket.acquire()
+            try:
+                await self.bot.send_message(chat_id, text)
+                metrics["sent"] += 1
+                return
+            except TelegramRetryAfter as e:
+                metrics["retried"] += 1
+                # Флуд-лимит Telegram распространяется на весь бот: приостанавливаем все отправки
+                self.paused_until = max(self.paused_until, time.monotonic() + e.retry_after)
+            except TelegramForbiddenError:
+                metrics["forbidden"] += 1
+                return
+            except TelegramNetworkError:
+                metrics["retried"] += 1
+                await asyncio.sleep(2 ** attempt)
+            except TelegramAPIError as e:
+                logger.warning("Уведомление в чат %s не отправлено: %s", chat_id, e)
+                break
+            except Exception:
+                logger.exception("Ошибка отправки уведомления в чат %s", chat_id)
+                await asyncio.sleep(2 ** attempt)
+        metrics["failed"] += 1
+
+    async def _send_chat(self, messages, metrics):
+        for fields in messages:
+            await self._send(fields, metrics)
+
+    async def process(self, messages):
+        await self._render(messages)
+        by_chat = defaultdict(list)
+        for _, fields in messages:
+            by_chat[fields["chat_id"]].append(fields)
+
+        metrics = defaultdict(int)
+        await asyncio.gather(*(self._send_chat(chat_messages, metrics) for chat_messages in by_chat.values()))
+
+        pipe = r.pipeline(transaction=False)
+        pipe.xack(NOTIFICATIONS_STREAM, CONSUMER_GROUP, *[message_id for message_id, _ in messages])
+        for name, value in metrics.items():
+            pipe.hincrby(METRICS_KEY, name, value)
+        await pipe.execute()
+
+    async def run(self):
+        try:
+            await r.xgroup_create(NOTIFICATIONS_STREAM, CONSUMER_GROUP, id="0", mkstream=True)
+        except Exception as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+        # Сначала дочитываем свои неподтверждённые сообщения, затем новые
+        last_id = "0"
+        next_maintenance = time.monotonic() + MAINTENANCE_INTERVAL
+        while True:
+            try:
+                if time.monotonic() >= next_maintenance:
+                    next_maintenance = time.monotonic() + MAINTENANCE_INTERVAL
+                    await self.maintain()
+
+                response = await r.xreadgroup(
+                    CONSUMER_GROUP, self.consumer, {NOTIFICATIONS_STREAM: last_id},
+                    count=NOTIFY_BATCH_SIZE, block=5000 if last_id == ">" else None,
+                )
+                messages = response[0][1] if response else []
+                if last_id == "0" and not messages:
+                    last_id = ">"
+                    continue
+                if messages:
+                    await self.process(messages)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Ошибка чтения стрима %s", NOTIFICATIONS_STREAM)
+                await asyncio.sleep(1)
+
+    async def maintain(self):
+        messages = await self._claim_stale()
+        if messages:
+            await self.process(messages)
+        await self._trim()
+
+    async def _claim_stale(self):
+        # Курсор XAUTOCLAIM переживает вызовы, чтобы за несколько тиков пройти весь список ожидающих
+        self.claim_cursor, messages, *_ = await r.xautoclaim(
+            NOTIFICATIONS_STREAM, CONSUMER_GROUP, self.consumer,
+            min_idle_time=CLAIM_IDLE_MS, start_id=self.claim_cursor, count=NOTIFY_BATCH_SIZE,
+        )
+        return messages
+
+    async def _trim(self):
+        """Удаляет из стрима только подтверждённые сообщения: всё старше самого раннего ожидающего."""
+        groups = await r.xinfo_groups(NOTIFICATIONS_STREAM)
+        group = next((g for g in groups if g["name"] == CONSUMER_GROUP), None)
+        if group is None:
+            return
+        pending = await r.xpending(NOTIFICATIONS_STREAM, CONSUMER_GROUP)
+        min_id = pending["min"] if pending["pending"] else group["last-delivered-id"]
+        if min_id and min_id != "0-0":
+            await r.xtrim(NOTIFICATIONS_STREAM, minid=min_id, approximate=False)
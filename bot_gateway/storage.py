@@ -0,0 +1,50 @@
+import asyncio
+from io import BytesIO
+from minio.error import S3Error
+from config import minio_client, BUCKET_NAME
+
+
+def _read_object(object_name):
+    response = minio_client.get_object(BUCKET_NAME, object_name)
+    try:
+        return response.read()
+    finally:
+        response.close()
+        response.release_conn()
+
+
+def _write_object(object_name, content, content_type):
+    minio_client.put_object(
+        bucket_name=BUCKET_NAME,
+        object_name=object_name,
+        data=BytesIO(content),
+        length=len(content),
+        content_type=content_type
+    )
+
+
+def _object_exists(object_name):
+    try:
+        minio_client.stat_object(BUCKET_NAME, object_name)
+        return True
+    except S3Error as e:
+        if e.code in ("NoSuchKey", "NoSuchObject"):
+            return False
+        raise
+
+
+async def object_exists(object_name):
+    return await asyncio.to_thread(_object_exists, object_name)
+
+
+async def get_object(object_name):
+    """Читает объект из MinIO в пуле потоков, не блокируя event loop."""
+    return await asyncio.to_thread(_read_object, object_name)
+
+
+async def get_objects(object_names):
+    return await asyncio.gather(*(get_object(name) for name in object_names))
+
+
+async def put_object(object_name, content, content_type="image/jpeg"):
+    await asyncio.to_thread(_write_object, object_name, content, content_type)
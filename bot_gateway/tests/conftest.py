@@ -0,0 +1,24 @@
+import os
+import sys
+import asyncio
+import pytest
+import fakeredis.aioredis
+
+os.environ.setdefault("TELEGRAM_TOKEN", "1:test")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Модули шлюза берут клиент Redis из config при импорте, поэтому подменяем его до них
+import config  # noqa: E402
+
+config.r = fakeredis.aioredis.FakeRedis(decode_responses=True)
+
+
+@pytest.fixture
+def redis():
+    asyncio.run(config.r.flushall())
+    return config.r
+
+
+@pytest.fixture
+def run():
+    return asyncio.run
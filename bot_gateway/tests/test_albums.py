@@ -0,0 +1,78 @@
+import asyncio
+from datetime import datetime
+from aiogram import Bot
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.types import Update, Message, Chat, User, PhotoSize
+import main
+from updates import UpdateQueue
+
+CHAT_ID = 42
+
+
+def photo_update(update_id, file_id, media_group_id="album"):
+    return Update(
+        update_id=update_id,
+        message=Message(
+            message_id=update_id,
+            date=datetime.now(),
+            chat=Chat(id=CHAT_ID, type="private"),
+            from_user=User(id=CHAT_ID, is_bot=False, first_name="Test"),
+            photo=[PhotoSize(file_id=file_id, file_unique_id=file_id, width=10, height=10)],
+            media_group_id=media_group_id,
+        ),
+    )
+
+
+def test_album_parts_are_saved_together(redis, run, monkeypatch):
+    sent = []
+
+    async def fake_call(self, method, request_timeout=None):
+        sent.append(method)
+
+    async def fake_upload(file_id):
+        return f"{file_id}.jpg"
+
+    monkeypatch.setattr(Bot, "__call__", fake_call)
+    monkeypatch.setattr(main, "upload_photo", fake_upload)
+    monkeypatch.setattr(main.media_groups, "debounce", 0.2)
+
+    async def scenario():
+        key = StorageKey(bot_id=main.bot.id, chat_id=CHAT_ID, user_id=CHAT_ID)
+        await main.dp.storage.set_state(main.bot, key, main.ProfileFSM.photos)
+
+        # Один воркер: все части альбома проходят через одну последовательную очередь чата
+        queue = UpdateQueue(workers=1, size=10)
+        queue.start(main.dp, main.bot)
+        for i, file_id in enumerate(["p1", "p2", "p3"], start=1):
+            await queue.put(photo_update(i, file_id))
+        await asyncio.sleep(1)
+        await queue.stop()
+
+        return (
+            await main.dp.storage.get_state(main.bot, key),
+            await main.dp.storage.get_data(main.bot, key),
+        )
+
+    state, data = run(scenario())
+    assert state == main.ProfileFSM.preview.state
+    assert data["photos"] == ["p1.jpg", "p2.jpg", "p3.jpg"]
+    assert len(sent) == 1
+
+
+def test_single_photo_is_saved_immediately(redis, run, monkeypatch):
+    async def fake_call(self, method, request_timeout=None):
+        pass
+
+    async def fake_upload(file_id):
+        return f"{file_id}.jpg"
+
+    monkeypatch.setattr(Bot, "__call__", fake_call)
+    monkeypatch.setattr(main, "upload_photo", fake_upload)
+
+    async def scenario():
+        key = StorageKey(bot_id=main.bot.id, chat_id=CHAT_ID, user_id=CHAT_ID)
+        await main.dp.storage.set_state(main.bot, key, main.ProfileFSM.photos)
+        await main.dp.feed_update(main.bot, photo_update(1, "solo", media_group_id=None))
+        return await main.dp.storage.get_data(main.bot, key)
+
+    assert run(scenario())["photos"] == ["solo.jpg"]
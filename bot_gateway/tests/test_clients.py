@@ -0,0 +1,38 @@
+import pytest
+import clients
+from clients import ServiceClient, ServiceError
+
+
+class FakeResponse:
+    status = 503
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeSession:
+    def __init__(self):
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append(method)
+        return FakeResponse()
+
+
+@pytest.mark.parametrize("method, idempotent, calls", [
+    ("GET", None, 3),
+    ("POST", None, 1),
+    ("POST", True, 3),
+    ("GET", False, 1),
+])
+def test_only_idempotent_requests_are_retried(run, monkeypatch, method, idempotent, calls):
+    session = FakeSession()
+    monkeypatch.setattr(clients, "get_session", lambda: session)
+    client = ServiceClient("http://service", retries=2, backoff=0)
+
+    with pytest.raises(ServiceError):
+        run(client.request(method, "/path", idempotent=idempotent))
+    assert len(session.calls) == calls
@@ -0,0 +1,54 @@
+import asyncio
+import deck
+from media import file_id_key
+from images import card_object_name
+
+
+class FakeMatchmaking:
+    def __init__(self, pages):
+        self.pages = list(pages)
+        self.calls = []
+
+    async def match(self, user_id, limit=1, mark_seen=True):
+        self.calls.append((limit, mark_seen))
+        page = self.pages.pop(0) if self.pages else []
+        return [profile(user_id) for user_id in page[:limit]]
+
+
+def profile(user_id):
+    return {"user_id": user_id, "name": "Имя", "age": 25, "city": "Москва", "photos": [f"http://minio/b/{user_id}.jpg"]}
+
+
+def test_deck_prefetches_without_marking_seen(redis, run, monkeypatch):
+    matchmaking = FakeMatchmaking([["1", "2", "3"], ["4", "5"]])
+    monkeypatch.setattr(deck, "matchmaking_client", matchmaking)
+
+    async def scenario():
+        await redis.set(file_id_key(card_object_name("1.jpg")), "tg-file-1")
+        swipe_deck = deck.SwipeDeck(size=3, refill_threshold=1, ttl=60, max_users=10)
+        first = await swipe_deck.pop(7)
+        second = await swipe_deck.pop(7)
+        await asyncio.sleep(0)
+        third = await swipe_deck.pop(7)
+        return first, second, third
+
+    first, second, third = run(scenario())
+    assert [first.user_id, second.user_id, third.user_id] == ["1", "2", "3"]
+    # Колода хранит только file_id, а не содержимое фото
+    assert first.file_ids == ["tg-file-1"]
+    assert second.file_ids == [None]
+    assert all(mark_seen is False for _, mark_seen in matchmaking.calls)
+    assert len(matchmaking.calls) == 2
+
+
+def test_expired_cards_are_dropped(redis, run, monkeypatch):
+    matchmaking = FakeMatchmaking([["1", "2"], ["3"]])
+    monkeypatch.setattr(deck, "matchmaking_client", matchmaking)
+
+    async def scenario():
+        swipe_deck = deck.SwipeDeck(size=2, refill_threshold=0, ttl=0.05, max_users=10)
+        await swipe_deck.pop(7)
+        await asyncio.sleep(0.1)
+        return await swipe_deck.pop(7)
+
+    assert run(scenario()).user_id == "3"
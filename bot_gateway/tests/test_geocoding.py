@@ -0,0 +1,21 @@
+import geocoding
+from geocoding import Geocoder, CityIndex
+
+
+def test_miss_is_retried_after_redis_entry_expires(redis, run, monkeypatch):
+    monkeypatch.setattr(geocoding, "GEOCODE_REMOTE_ENABLED", False)
+    geocoder = Geocoder(redis, CityIndex([]))
+
+    async def scenario():
+        first = await geocoder.city(55.75, 37.62)
+        # Промах в Redis истёк, а справочник за это время узнал город
+        await redis.delete("geocode:55.75:37.62")
+        geocoder.index = CityIndex([("Москва", 55.75, 37.62)])
+        second = await geocoder.city(55.75, 37.62)
+        return first, second, await redis.get("geocode:55.75:37.62")
+
+    first, second, cached = run(scenario())
+    assert first is None
+    assert second == "Москва"
+    assert cached == "Москва"
+    assert geocoder.lru == {"55.75:37.62": "Москва"}
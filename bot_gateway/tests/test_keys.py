@@ -0,0 +1,46 @@
+import asyncio
+import keys
+from keys import KeySpace, RETIRED_EPOCHS_KEY
+
+
+def test_old_generation_waits_for_grace_period(redis, run, monkeypatch):
+    monkeypatch.setattr(keys, "KEYSPACE_CLEANUP_GRACE", 0.3)
+
+    async def scenario():
+        keyspace = KeySpace(redis)
+        await redis.set("keyspace:legacy_removed", 1)
+        await redis.set(await keyspace.key("votes", 1), "x")
+        await keyspace.bump()
+        # Сервис с закэшированным поколением ещё пишет в старое
+        await redis.set("e0:votes:2", "x")
+
+        cleanup = asyncio.create_task(keyspace.cleanup_old_generations())
+        await asyncio.sleep(0.1)
+        during_grace = sorted(await redis.keys("e0:*"))
+        await asyncio.wait_for(cleanup, 5)
+        return during_grace, await redis.keys("e0:*"), await redis.zcard(RETIRED_EPOCHS_KEY)
+
+    during_grace, after, retired = run(scenario())
+    assert during_grace == ["e0:votes:1", "e0:votes:2"]
+    assert after == []
+    assert retired == 0
+
+
+def test_legacy_unprefixed_keys_are_removed_once(redis, run):
+    async def scenario():
+        await redis.hset("votes:1", "2", "like")
+        await redis.rpush("liked_by:2", "1")
+        await redis.set("shown_user_ids:1", "x")
+        await redis.set("match_message:5", "7")
+        await redis.set("e1:votes:1", "x")
+        await redis.set("keyspace:epoch", 1)
+        await KeySpace(redis).cleanup_old_generations()
+        first = sorted(await redis.keys("*"))
+
+        await redis.hset("votes:3", "4", "like")
+        await KeySpace(redis).cleanup_old_generations()
+        return first, await redis.exists("votes:3")
+
+    first, second_run = run(scenario())
+    assert first == ["e1:votes:1", "keyspace:epoch", "keyspace:legacy_removed", "match_message:5"]
+    assert second_run == 1
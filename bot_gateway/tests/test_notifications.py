@@ -0,0 +1,93 @@
+import asyncio
+import notifications
+from notifications import NotificationSender, TokenBucket, NOTIFICATIONS_STREAM, CONSUMER_GROUP
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text):
+        self.sent.append((chat_id, text))
+
+
+def test_token_bucket_spaces_out_messages(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(notifications.time, "monotonic", lambda: now[0])
+    bucket = TokenBucket(rate=2, capacity=1)
+
+    assert bucket.delay() == 0
+    assert bucket.delay() == 0.5
+    now[0] += 1.0
+    assert bucket.delay() == 0
+
+
+def test_chat_buckets_evict_least_recently_used(monkeypatch):
+    monkeypatch.setattr(notifications, "CHAT_BUCKETS_LIMIT", 2)
+    sender = NotificationSender(FakeBot(), consumer="c")
+    first = sender._chat_bucket("1")
+    sender._chat_bucket("2")
+    sender._chat_bucket("1")
+    sender._chat_bucket("3")
+
+    assert list(sender.chat_buckets) == ["1", "3"]
+    assert sender._chat_bucket("1") is first
+
+
+def test_match_contacts_are_loaded_once_per_batch(redis, run, monkeypatch):
+    calls = []
+
+    class FakeUserClient:
+        async def get_profiles(self, user_ids):
+            calls.append(sorted(user_ids))
+            return {"2": {"user_id": "2", "username": "other"}}
+
+    class FlakyBot(FakeBot):
+        async def send_message(self, chat_id, text):
+            if not self.sent:
+                self.sent.append(None)
+                raise notifications.TelegramNetworkError(method=None, message="timeout")
+            self.sent.append((chat_id, text))
+
+    monkeypatch.setattr(notifications, "user_client", FakeUserClient())
+    sleep = asyncio.sleep
+    monkeypatch.setattr(notifications.asyncio, "sleep", lambda delay: sleep(0))
+    bot = FlakyBot()
+    messages = [
+        ("1-0", {"chat_id": "1", "text": "", "match_with": "2"}),
+        ("2-0", {"chat_id": "4", "text": "", "match_with": "3"}),
+        ("3-0", {"chat_id": "5", "text": "привет"}),
+    ]
+
+    run(NotificationSender(bot, consumer="c").process(messages))
+    # Одна загрузка анкет на пачку, и повтор отправки её не повторяет
+    assert calls == [["2", "3"]]
+    assert sorted(m for m in bot.sent if m) == [
+        ("1", "🎉 У вас мэтч с пользователем!\nСвяжитесь: https://t.me/other"),
+        ("4", "🎉 У вас мэтч с пользователем!\nСвяжитесь: ID: 3"),
+        ("5", "привет"),
+    ]
+
+
+def test_stale_messages_are_claimed_and_acked_entries_trimmed(redis, run, monkeypatch):
+    monkeypatch.setattr(notifications, "CLAIM_IDLE_MS", 0)
+
+    async def scenario():
+        await redis.xgroup_create(NOTIFICATIONS_STREAM, CONSUMER_GROUP, id="0", mkstream=True)
+        for chat_id in ("1", "2", "3"):
+            await notifications.enqueue(chat_id, "привет")
+        ids = [message_id for message_id, _ in await redis.xrange(NOTIFICATIONS_STREAM)]
+        # Другой процесс взял сообщения и упал, не подтвердив их
+        await redis.xreadgroup(CONSUMER_GROUP, "dead", {NOTIFICATIONS_STREAM: ">"}, count=2)
+
+        bot = FakeBot()
+        await NotificationSender(bot, consumer="alive").maintain()
+        left = [message_id for message_id, _ in await redis.xrange(NOTIFICATIONS_STREAM)]
+        return bot, ids, left, await redis.xpending(NOTIFICATIONS_STREAM, CONSUMER_GROUP)
+
+    bot, ids, left, pending = run(scenario())
+    assert sorted(chat_id for chat_id, _ in bot.sent) == ["1", "2"]
+    assert pending["pending"] == 0
+    # Подтверждённое сообщение удалено, а ещё не прочитанное третье осталось в стриме
+    assert ids[0] not in left
+    assert ids[2] in left
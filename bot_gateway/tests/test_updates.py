@@ -0,0 +1,125 @@
+import json
+import asyncio
+import pytest
+from aiogram.types import Update
+import updates
+
+
+class RecordingDispatcher:
+    def __init__(self):
+        self.updates = []
+
+    async def feed_raw_update(self, bot, update):
+        self.updates.append(update["update_id"])
+
+
+def test_second_process_cannot_take_owned_shards(redis, run, monkeypatch):
+    async def scenario():
+        monkeypatch.setattr(updates, "INSTANCE_ID", "host-a:1")
+        await updates.acquire_shards([0, 1])
+        monkeypatch.setattr(updates, "INSTANCE_ID", "host-b:2")
+        await updates.acquire_shards([2])
+        with pytest.raises(RuntimeError):
+            await updates.acquire_shards([1, 2], timeout=0)
+
+    run(scenario())
+
+
+def test_consumer_adopts_pending_updates_of_previous_owner(redis, run, monkeypatch):
+    monkeypatch.setattr(updates, "INSTANCE_ID", "host-new:2")
+    stream = updates.UPDATES_STREAM.format(shard=0)
+    dp = RecordingDispatcher()
+
+    async def scenario():
+        await redis.xgroup_create(stream, updates.CONSUMER_GROUP, id="0", mkstream=True)
+        for update_id in (1, 2):
+            await redis.xadd(stream, {"update": json.dumps({"update_id": update_id})})
+        # Прежний владелец шарда получил апдейты и умер, не подтвердив их
+        await redis.xreadgroup(updates.CONSUMER_GROUP, "shard-0:host-old:1", {stream: ">"})
+        await redis.xadd(stream, {"update": json.dumps({"update_id": 3})})
+
+        task = asyncio.create_task(updates.consume_shard(dp, None, 0))
+        await asyncio.sleep(0.3)
+        task.cancel()
+        consumers = await redis.xinfo_consumers(stream, updates.CONSUMER_GROUP)
+        pending = await redis.xpending(stream, updates.CONSUMER_GROUP)
+        return consumers, pending
+
+    consumers, pending = run(scenario())
+    assert dp.updates == [1, 2, 3]
+    assert [c["name"] for c in consumers] == ["shard-0:host-new:2"]
+    assert pending["pending"] == 0
+
+
+def test_poll_updates_confirms_processed_updates(run):
+    class FakeBot:
+        def __init__(self):
+            self.offsets = []
+
+        async def get_updates(self, offset=None, timeout=None, request_timeout=None):
+            self.offsets.append(offset)
+            if len(self.offsets) == 1:
+                return [Update(update_id=10), Update(update_id=11)]
+            if len(self.offsets) == 2:
+                raise ConnectionError("network down")
+            await asyncio.sleep(10)
+
+    bot = FakeBot()
+    received = []
+
+    async def sink(update):
+        received.append(update.update_id)
+
+    async def scenario():
+        task = asyncio.create_task(updates.poll_updates(bot, sink))
+        await asyncio.sleep(1.2)
+        task.cancel()
+
+    run(scenario())
+    assert received == [10, 11]
+    assert bot.offsets == [None, 12, 12]
+
+
+def test_poller_survives_redis_and_publish_errors(redis, run, monkeypatch):
+    monkeypatch.setattr(updates, "INSTANCE_ID", "host-a:1")
+
+    class FakeBot:
+        async def get_updates(self, offset=None, timeout=None, request_timeout=None):
+            if offset is None:
+                return [Update(update_id=10)]
+            await asyncio.sleep(10)
+            return []
+
+    failures = {"set": 1, "publish": 1}
+    published = []
+    real_set = redis.set
+
+    async def flaky_set(*args, **kwargs):
+        if failures["set"]:
+            failures["set"] -= 1
+            raise ConnectionError("redis down")
+        return await real_set(*args, **kwargs)
+
+    async def flaky_publish(update):
+        if failures["publish"]:
+            failures["publish"] -= 1
+            raise ConnectionError("redis down")
+        published.append(update.update_id)
+
+    monkeypatch.setattr(redis, "set", flaky_set)
+    monkeypatch.setattr(updates, "publish_update", flaky_publish)
+
+    async def scenario():
+        task = asyncio.create_task(updates.poll_and_publish(FakeBot()))
+        for _ in range(50):
+            await asyncio.sleep(0.1)
+            if published:
+                break
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return await redis.get(updates.POLLER_LOCK_KEY)
+
+    owner = run(scenario())
+    # Апдейт, запись которого в стрим не удалась, Telegram выдал повторно, и он опубликован
+    assert published == [10]
+    assert owner == "host-a:1"
@@ -0,0 +1,43 @@
+import votes
+
+
+def test_likes_received_follows_vote_transitions(redis, run):
+    async def scenario():
+        counts = []
+        for vote in ["like", "like", "dislike", "like", "dislike", "dislike", "like"]:
+            await votes.record_vote(1, 2, vote)
+            counts.append(int(await redis.hget("e0:likes_received", "2") or 0))
+        return counts
+
+    assert run(scenario()) == [1, 1, 0, 1, 0, 0, 1]
+
+
+def test_dislike_first_then_like_is_counted(redis, run):
+    async def scenario():
+        await votes.record_vote(1, 2, "dislike")
+        await votes.record_vote(1, 2, "like")
+        return int(await redis.hget("e0:likes_received", "2") or 0), await votes.inbox_count(2)
+
+    assert run(scenario()) == (1, 1)
+
+
+def test_withdrawn_like_leaves_inbox(redis, run):
+    async def scenario():
+        await votes.record_vote(1, 2, "like")
+        await votes.record_vote(3, 2, "like")
+        await votes.record_vote(3, 2, "like")
+        before = await votes.inbox_count(2)
+        await votes.record_vote(1, 2, "dislike")
+        return before, await votes.inbox_count(2), await votes.pop_liker(2)
+
+    assert run(scenario()) == (2, 1, "3")
+
+
+def test_mutual_like_creates_match_once(redis, run):
+    async def scenario():
+        first = await votes.record_vote(1, 2, "like")
+        second = await votes.record_vote(2, 1, "like")
+        repeated = await votes.record_vote(2, 1, "like")
+        return first, second, repeated, await votes.inbox_count(1), await redis.smembers("e0:matches:1")
+
+    assert run(scenario()) == (False, True, False, 0, {"2"})
@@ -0,0 +1,282 @@
+import os
+import json
+import socket
+import asyncio
+import logging
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from config import r, GATEWAY_SHARDS, GATEWAY_SHARD_IDS, UPDATE_WORKERS, UPDATE_QUEUE_SIZE
+
+logger = logging.getLogger(__name__)
+
+UPDATES_STREAM = "updates:{shard}"
+UPDATES_STREAM_MAXLEN = 100000
+CONSUMER_GROUP = "gateway"
+POLLER_LOCK_KEY = "gateway:poller"
+POLLER_LOCK_TTL = 30
+SHARD_LOCK_KEY = "gateway:shard:{shard}"
+# Сколько ждать аренды шарда при старте: старый процесс при деплое отпускает её не сразу
+SHARD_ACQUIRE_TIMEOUT = POLLER_LOCK_TTL * 2
+POLLING_TIMEOUT = 30
+MAX_POLLING_BACKOFF = 60
+INSTANCE_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# Продлевает блокировку поллера, только если она всё ещё принадлежит этому процессу
+RENEW_LOCK_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+renew_lock_script = r.register_script(RENEW_LOCK_LUA)
+
+
+def update_chat_id(update: Update):
+    event = update.event
+    chat = getattr(event, "chat", None) or getattr(getattr(event, "message", None), "chat", None)
+    if chat is not None:
+        return chat.id
+    user = getattr(event, "from_user", None)
+    return user.id if user is not None else 0
+
+
+def shard_for(chat_id):
+    return chat_id % GATEWAY_SHARDS
+
+
+async def publish_update(update: Update):
+    """Кладёт апдейт в стрим шарда его чата: все апдейты одного чата обрабатывает один процесс по порядку."""
+    stream = UPDATES_STREAM.format(shard=shard_for(update_chat_id(update)))
+    await r.xadd(
+        stream,
+        {"update": update.json(exclude_unset=True)},
+        maxlen=UPDATES_STREAM_MAXLEN,
+        approximate=True,
+    )
+
+
+class UpdateQueue:
+    """
+    Ограниченная очередь апдейтов с пулом воркеров.
+
+    У каждого воркера своя очередь, и апдейты одного чата всегда попадают к одному
+    воркеру, поэтому внутри чата порядок сохраняется, а разные чаты обрабатываются
+    параллельно. Когда очередь воркера заполнена, put ждёт - это и есть backpressure.
+    """
+
+    def __init__(self, workers=UPDATE_WORKERS, size=UPDATE_QUEUE_SIZE):
+        self.queues = [asyncio.Queue(maxsize=max(size // workers, 1)) for _ in range(workers)]
+        self.tasks = []
+
+    def start(self, dp: Dispatcher, bot: Bot):
+        self.tasks = [asyncio.create_task(self._worker(dp, bot, q)) for q in self.queues]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    async def put(self, update: Update, timeout=None):
+        """Ставит апдейт в очередь. Возвращает False, если место не освободилось за timeout секунд."""
+        queue = self.queues[update_chat_id(update) % len(self.queues)]
+        try:
+            await asyncio.wait_for(queue.put(update), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def _worker(self, dp: Dispatcher, bot: Bot, queue: asyncio.Queue):
+        while True:
+            update = await queue.get()
+            try:
+                await dp.feed_update(bot, update)
+            except Exception:
+                logger.exception("Ошибка обработки апдейта %s", update.update_id)
+            finally:
+                queue.task_done()
+
+
+async def poll_updates(bot: Bot, sink):
+    """Long polling через getUpdates; при ошибках сети повторяет запрос с растущей задержкой."""
+    offset = None
+    delay = 1
+    while True:
+        try:
+            updates = await bot.get_updates(
+                offset=offset, timeout=POLLING_TIMEOUT, request_timeout=POLLING_TIMEOUT + 10,
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Не удалось получить апдейты: %s, повтор через %s с", e, delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_POLLING_BACKOFF)
+            continue
+
+        delay = 1
+        for update in updates:
+            await sink(update)
+            # Апдейты с меньшим update_id Telegram считает подтверждёнными
+            offset = update.update_id + 1
+
+
+async def take_lease(key):
+    """Берёт свободную аренду или продлевает свою. Возвращает False, если ей владеет другой процесс."""
+    if await r.set(key, INSTANCE_ID, nx=True, ex=POLLER_LOCK_TTL):
+        return True
+    return bool(await renew_lock_script(keys=[key], args=[INSTANCE_ID, POLLER_LOCK_TTL]))
+
+
+async def poll_and_publish(bot: Bot):
+    """
+    Получает апдейты long polling'ом и раскладывает их по стримам шардов.
+
+    Опрашивать Telegram может только один процесс, поэтому поллер берёт блокировку
+    в Redis; если владелец умер (например, при деплое), её подхватывает другой процесс.
+    Если опрос упал (например, не удалось записать апдейт в стрим), процесс сразу
+    продлевает свою блокировку и опрашивает заново: неподтверждённые апдейты Telegram
+    выдаст повторно.
+    """
+    while True:
+        poll = None
+        try:
+            if not await take_lease(POLLER_LOCK_KEY):
+                await asyncio.sleep(POLLER_LOCK_TTL / 3)
+                continue
+
+            logger.info("Процесс %s опрашивает Telegram", INSTANCE_ID)
+            poll = asyncio.create_task(poll_updates(bot, publish_update))
+            while not poll.done():
+                await asyncio.wait({poll}, timeout=POLLER_LOCK_TTL / 3)
+                if poll.done():
+                    break
+                if not await renew_lock_script(keys=[POLLER_LOCK_KEY], args=[INSTANCE_ID, POLLER_LOCK_TTL]):
+                    logger.warning("Процесс %s потерял блокировку поллера", INSTANCE_ID)
+                    break
+            if poll.done() and not poll.cancelled() and poll.exception():
+                raise poll.exception()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Ошибка поллера апдейтов")
+            await asyncio.sleep(1)
+        finally:
+            if poll is not None:
+                poll.cancel()
+
+
+def owned_shards():
+    return GATEWAY_SHARD_IDS or list(range(GATEWAY_SHARDS))
+
+
+async def acquire_shards(shards, timeout=SHARD_ACQUIRE_TIMEOUT):
+    """
+    Берёт аренду на шарды этого процесса. Шард обслуживает ровно один процесс, иначе
+    апдейты одного чата обрабатывались бы параллельно. Если шард за timeout секунд
+    не освободился, шлюз не стартует: при нескольких репликах каждой нужно задать
+    свои GATEWAY_SHARD_IDS.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        busy = [shard for shard in shards if not await take_lease(SHARD_LOCK_KEY.format(shard=shard))]
+        if not busy:
+            return
+        if loop.time() >= deadline:
+            raise RuntimeError(
+                f"Шарды {busy} обслуживает другой процесс шлюза; "
+                "при нескольких репликах задайте каждой свои GATEWAY_SHARD_IDS"
+            )
+        await asyncio.sleep(POLLER_LOCK_TTL / 3)
+
+
+async def adopt_pending(stream, consumer):
+    """
+    Забирает неподтверждённые апдейты прежних потребителей шарда и удаляет их из группы.
+    Вызывается только под арендой шарда, поэтому прежние потребители уже не работают.
+    """
+    start_id = "0-0"
+    while True:
+        start_id, _, *_ = await r.xautoclaim(
+            stream, CONSUMER_GROUP, consumer, min_idle_time=0, start_id=start_id, count=100,
+        )
+        if start_id == "0-0":
+            break
+    for info in await r.xinfo_consumers(stream, CONSUMER_GROUP):
+        if info["name"] != consumer:
+            await r.xgroup_delconsumer(stream, CONSUMER_GROUP, info["name"])
+
+
+async def consume_shard(dp: Dispatcher, bot: Bot, shard: int):
+    """
+    Обрабатывает апдейты одного шарда последовательно, сохраняя порядок внутри чата.
+
+    Запускается только под арендой шарда. Имя потребителя уникально для процесса;
+    апдейты, выданные прежнему владельцу шарда и не подтверждённые им, обрабатываются первыми.
+    """
+    stream = UPDATES_STREAM.format(shard=shard)
+    consumer = f"shard-{shard}:{INSTANCE_ID}"
+    try:
+        await r.xgroup_create(stream, CONSUMER_GROUP, id="0", mkstream=True)
+    except Exception as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+    await adopt_pending(stream, consumer)
+
+    last_id = "0"
+    while True:
+        try:
+            response = await r.xreadgroup(
+                CONSUMER_GROUP, consumer, {stream: last_id},
+                count=100, block=5000 if last_id == ">" else None,
+            )
+            messages = response[0][1] if response else []
+            if last_id == "0" and not messages:
+                last_id = ">"
+                continue
+            for message_id, fields in messages:
+                try:
+                    await dp.feed_raw_update(bot, json.loads(fields["update"]))
+                except Exception:
+                    logger.exception("Ошибка обработки апдейта %s", message_id)
+                await r.xack(stream, CONSUMER_GROUP, message_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Ошибка чтения стрима %s", stream)
+            await asyncio.sleep(1)
+
+
+async def keep_shards(dp: Dispatcher, bot: Bot, shards):
+    """Продлевает аренду шардов; шард, аренда которого потеряна, не обрабатывается, пока её не удастся вернуть."""
+    consumers = {shard: asyncio.create_task(consume_shard(dp, bot, shard)) for shard in shards}
+    try:
+        while True:
+            await asyncio.sleep(POLLER_LOCK_TTL / 3)
+            for shard in shards:
+                try:
+                    leased = await take_lease(SHARD_LOCK_KEY.format(shard=shard))
+                except Exception:
+                    # Аренда живёт POLLER_LOCK_TTL, поэтому разовую ошибку Redis переживаем до следующего продления
+                    logger.exception("Не удалось продлить аренду шарда %s", shard)
+                    continue
+                if leased:
+                    if consumers[shard].done():
+                        logger.info("Процесс %s вернул аренду шарда %s", INSTANCE_ID, shard)
+                        consumers[shard] = asyncio.create_task(consume_shard(dp, bot, shard))
+                elif not consumers[shard].done():
+                    logger.error("Процесс %s потерял аренду шарда %s", INSTANCE_ID, shard)
+                    consumers[shard].cancel()
+    finally:
+        for task in consumers.values():
+            task.cancel()
+
+
+async def run_sharded(dp: Dispatcher, bot: Bot, shards, polling=True):
+    """Обработка шардов, аренда которых уже взята acquire_shards; в режиме вебхука апдейты в стримы кладёт HTTP-обработчик."""
+    logger.info("Шлюз обслуживает шарды %s из %s", list(shards), GATEWAY_SHARDS)
+    tasks = [keep_shards(dp, bot, shards)]
+    if polling:
+        tasks.append(poll_and_publish(bot))
+    await asyncio.gather(*tasks)
@@ -0,0 +1,85 @@
+import time
+from config import r
+from keys import keyspace
+
+VOTE_EVENTS_STREAM = "vote_events"
+VOTE_EVENTS_MAXLEN = 100000
+
+# Записывает голос, публикует событие для пересчёта рейтинга, ведёт "входящие" лайки
+# и проверяет взаимность - всё за один вызов.
+# Входящие - ZSET по времени лайка: ZADD NX не даёт продублировать лайкнувшего, а тот,
+# по чьей анкете цель уже проголосовала, во входящие не попадает. Голос по анкете
+# убирает её из входящих голосующего. likes_received считает текущие лайки: растёт при
+# переходе к лайку и уменьшается, когда лайк меняют на дизлайк.
+# Возвращает 1, если голос создал новый мэтч.
+RECORD_VOTE_LUA = """
+local voter, target, vote = ARGV[1], ARGV[2], ARGV[3]
+local previous = redis.call('HGET', KEYS[1], target)
+if previous == vote then
+    return 0
+end
+
+redis.call('HSET', KEYS[1], target, vote)
+redis.call('XADD', KEYS[6], 'MAXLEN', '~', ARGV[4], '*', 'voter', voter, 'target', target, 'vote', vote)
+redis.call('ZREM', KEYS[7], target)
+
+if vote ~= 'like' then
+    if previous == 'like' then
+        -- Лайк отозван: счётчик и входящие цели должны отражать текущие голоса
+        redis.call('HINCRBY', KEYS[8], target, -1)
+        redis.call('ZREM', KEYS[3], voter)
+    end
+    return 0
+end
+redis.call('HINCRBY', KEYS[8], target, 1)
+local reply = redis.call('HGET', KEYS[2], voter)
+if reply == 'like' then
+    redis.call('SADD', KEYS[5], voter)
+    return redis.call('SADD', KEYS[4], target)
+end
+if not reply then
+    redis.call('ZADD', KEYS[3], 'NX', ARGV[5], voter)
+end
+return 0
+"""
+
+record_vote_script = r.register_script(RECORD_VOTE_LUA)
+
+
+async def inbox_key(user_id):
+    return await keyspace.key("inbox", user_id)
+
+
+async def record_vote(voter_id, target_id, vote):
+    """Атомарно записывает голос. Возвращает True, если голос создал новый взаимный мэтч."""
+    voter_id, target_id = str(voter_id), str(target_id)
+    matched = await record_vote_script(
+        keys=[
+            await keyspace.key("votes", voter_id),
+            await keyspace.key("votes", target_id),
+            await inbox_key(target_id),
+            await keyspace.key("matches", voter_id),
+            await keyspace.key("matches", target_id),
+            VOTE_EVENTS_STREAM,
+            await inbox_key(voter_id),
+            await keyspace.key("likes_received"),
+        ],
+        args=[voter_id, target_id, vote, VOTE_EVENTS_MAXLEN, time.time()],
+    )
+    return bool(matched)
+
+
+async def inbox_count(user_id):
+    """Число непросмотренных лайков за O(1)."""
+    return await r.zcard(await inbox_key(user_id))
+
+
+async def pop_liker(user_id):
+    """Атомарно забирает из входящих самого раннего лайкнувшего. Возвращает его ID или None."""
+    popped = await r.zpopmin(await inbox_key(user_id))
+    return popped[0][0] if popped else None
+
+
+async def return_liker(user_id, liker_id):
+    """Возвращает лайкнувшего в начало входящих, если его анкету не удалось показать."""
+    await r.zadd(await inbox_key(user_id), {liker_id: 0}, nx=True)
@@ -0,0 +1,27 @@
+import os
+import time
+
+EPOCH_KEY = "keyspace:epoch"
+KEYSPACE_EPOCH_REFRESH = float(os.getenv("KEYSPACE_EPOCH_REFRESH", 5))
+
+
+class KeySpace:
+    """
+    Ключи пользовательских данных с префиксом поколения e{epoch}:. Поколение меняет шлюз
+    при сбросе данных; здесь его значение кэшируется на KEYSPACE_EPOCH_REFRESH секунд.
+    """
+
+    def __init__(self, r):
+        self.r = r
+        self._epoch = None
+        self._fetched_at = 0.0
+
+    def epoch(self):
+        now = time.monotonic()
+        if self._epoch is None or now - self._fetched_at > KEYSPACE_EPOCH_REFRESH:
+            self._epoch = int(self.r.get(EPOCH_KEY) or 0)
+            self._fetched_at = now
+        return self._epoch
+
+    def key(self, *parts):
+        return ":".join([f"e{self.epoch()}", *map(str, parts)])
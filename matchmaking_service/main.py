@@ -1,8 +1,31 @@
-from fastapi import FastAPI
-from matcher import find_matches
+from typing import List, Optional
+from fastapi import FastAPI, BackgroundTasks, Query
+from pydantic import BaseModel
+from matcher import find_matches, find_nearby, mark_seen as mark_candidates_seen, needs_refill, refill_queue, MAX_MATCH_LIMIT
 
 app = FastAPI()
 
 @app.get("/match")
-def match(user_id: int):
-    return find_matches(user_id)
+def match(
+    user_id: int,
+    background_tasks: BackgroundTasks,
+    limit: int = Query(1, ge=1, le=MAX_MATCH_LIMIT),
+    radius_km: Optional[float] = Query(None, gt=0),
+    mark_seen: bool = True,
+):
+    if radius_km is not None:
+        return find_nearby(user_id, radius_km, limit)
+
+    matches = find_matches(user_id, limit, mark_as_seen=mark_seen)
+    if needs_refill(user_id):
+        background_tasks.add_task(refill_queue, user_id)
+    return matches
+
+class SeenRequest(BaseModel):
+    user_id: int
+    ids: List[str]
+
+@app.post("/seen")
+def seen(request: SeenRequest):
+    mark_candidates_seen(request.user_id, request.ids)
+    return {"ok": True}
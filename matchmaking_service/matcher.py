@@ -1,32 +1,287 @@
 import requests
 import os
+import time
 import redis
+from collections import Counter
+from ranking import CandidateRanker
+from seen import SeenFilter
+from keys import KeySpace
 
 USER_SERVICE_URL = os.getenv("USER_SERVICE_URL", "http://user_service:8000")
 REDIS_HOST = os.getenv("REDIS_HOST", "redis")
 REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
 
+# Размер пачки, которой фоновый рефиллер пополняет очередь кандидатов,
+# и порог, ниже которого запускается пополнение.
+QUEUE_BATCH_SIZE = int(os.getenv("MATCH_QUEUE_BATCH_SIZE", 50))
+QUEUE_REFILL_THRESHOLD = int(os.getenv("MATCH_QUEUE_REFILL_THRESHOLD", 10))
+QUEUE_TTL = int(os.getenv("MATCH_QUEUE_TTL", 3600))
+REFILL_LOCK_TTL = 30
+# Сколько синхронный запрос ждёт рефилл, уже идущий в фоне, прежде чем ответить пустым списком
+REFILL_WAIT = float(os.getenv("MATCH_REFILL_WAIT", 3))
+REFILL_WAIT_POLL = 0.05
+MAX_MATCH_LIMIT = 20
+USERS_PAGE_SIZE = int(os.getenv("MATCH_USERS_PAGE_SIZE", 200))
+MAX_REFILL_PAGES = int(os.getenv("MATCH_MAX_REFILL_PAGES", 5))
+GEO_KEY = "geo:users"
+ELO_RATINGS_KEY = "elo_ratings"
+RANK_POOL_SIZE = int(os.getenv("MATCH_RANK_POOL_SIZE", 200))
+MAX_GEO_SCAN = int(os.getenv("MATCH_MAX_GEO_SCAN", 1000))
+# Сколько кандидатов с общими интересами брать из обратного индекса user_service
+INTEREST_POOL_SIZE = int(os.getenv("MATCH_INTEREST_POOL_SIZE", 100))
+# Из популярных интересов читаем случайную выборку, а не всё множество пользователей
+INTEREST_POSTING_SAMPLE = int(os.getenv("MATCH_INTEREST_POSTING_SAMPLE", 500))
+INTEREST_USERS_KEY = "interest:{interest_id}:users"
+
 r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+keyspace = KeySpace(r)
+seen = SeenFilter(r, keyspace)
+http = requests.Session()
+
+
+def queue_key(user_id):
+    return keyspace.key("candidates", user_id)
+
+
+def cursor_key(user_id):
+    return keyspace.key("candidates_cursor", user_id)
+
+
+def spill_key(user_id):
+    return keyspace.key("candidates_spill", user_id)
+
 
-def get_users(exclude_user_id):
+def refill_lock_key(user_id):
+    return f"candidates_lock:{user_id}"
+
+
+def get_users_page(exclude_user_id, cursor=None, limit=USERS_PAGE_SIZE):
+    params = {"limit": limit, "exclude": str(exclude_user_id)}
+    if cursor:
+        params["cursor"] = cursor
     try:
-        response = requests.get(f"{USER_SERVICE_URL}/users")
+        response = http.get(f"{USER_SERVICE_URL}/users", params=params)
         if response.status_code != 200:
-            return []
-        users = response.json()
-        return [u for u in users if str(u["user_id"]) != str(exclude_user_id)]
+            return [], None
+        page = response.json()
+        return page["items"], page["next_cursor"]
     except Exception as e:
         print("Ошибка получения пользователей:", e)
+        return [], None
+
+
+def get_profiles(user_ids):
+    if not user_ids:
+        return []
+    try:
+        response = http.get(f"{USER_SERVICE_URL}/profiles", params={"ids": ",".join(user_ids)})
+        if response.status_code != 200:
+            return []
+        return response.json()
+    except Exception as e:
+        print("Ошибка получения профилей:", e)
+        return []
+
+
+def interest_candidates(user, exclude):
+    """
+    Кандидаты с общими интересами из обратного индекса: объединение множеств пользователей
+    по каждому интересу, где счёт участника - число общих интересов. Берём лучших по счёту.
+    Из множества длиннее INTEREST_POSTING_SAMPLE читается случайная выборка такого размера,
+    поэтому стоимость не растёт с популярностью интереса.
+    """
+    interest_ids = user.get("interest_ids") if user else None
+    if not interest_ids:
+        return []
+
+    keys = [INTEREST_USERS_KEY.format(interest_id=i) for i in interest_ids]
+    pipe = r.pipeline(transaction=False)
+    for key in keys:
+        pipe.scard(key)
+    sizes = pipe.execute()
+
+    pipe = r.pipeline(transaction=False)
+    for key, size in zip(keys, sizes):
+        if size > INTEREST_POSTING_SAMPLE:
+            pipe.srandmember(key, INTEREST_POSTING_SAMPLE)
+        else:
+            pipe.smembers(key)
+    overlap = Counter(member for posting in pipe.execute() for member in posting)
+
+    user_id = str(user["user_id"])
+    overlap.pop(user_id, None)
+    for member in exclude:
+        overlap.pop(member, None)
+    members = [m for m, _ in overlap.most_common(INTEREST_POOL_SIZE)]
+    if not members:
+        return []
+    shown = seen.contains_many(user_id, members)
+    return get_profiles([m for m, is_shown in zip(members, shown) if not is_shown])
+
+
+def get_elo_ratings(user_ids):
+    scores = r.zmscore(ELO_RATINGS_KEY, user_ids) if user_ids else []
+    return {uid: score for uid, score in zip(user_ids, scores) if score is not None}
+
+
+def rank_candidates(user_id, user, pool, k):
+    if not pool:
         return []
+    if not user:
+        return [str(c["user_id"]) for c in pool[:k]]
+
+    ratings = get_elo_ratings([str(user_id)] + [str(c["user_id"]) for c in pool])
+    ranker = CandidateRanker(user, ratings.get(str(user_id)))
+    return ranker.top(pool, ratings, k)
+
+
+def needs_refill(user_id):
+    return r.llen(queue_key(user_id)) < QUEUE_REFILL_THRESHOLD
+
+
+def wait_for_refill(user_id, timeout=REFILL_WAIT):
+    """Ждёт, пока другой процесс закончит рефилл, и возвращает длину очереди."""
+    deadline = time.monotonic() + timeout
+    while r.exists(refill_lock_key(user_id)) and time.monotonic() < deadline:
+        time.sleep(REFILL_WAIT_POLL)
+    return r.llen(queue_key(user_id))
+
+
+def refill_queue(user_id):
+    """Дозаполняет очередь кандидатов пользователя пачкой непоказанных ID."""
+    lock_key = refill_lock_key(user_id)
+    if not r.set(lock_key, 1, nx=True, ex=REFILL_LOCK_TTL):
+        return 0
+
+    try:
+        key = queue_key(user_id)
+        queued = set(r.lrange(key, 0, -1))
+
+        # Сначала отдаём уже отранжированных кандидатов, не попавших в прошлую пачку
+        while spilled := r.lpop(spill_key(user_id), QUEUE_BATCH_SIZE):
+            spilled = [i for i in spilled if i not in queued]
+            shown = seen.contains_many(user_id, spilled) if spilled else []
+            batch = [i for i, is_shown in zip(spilled, shown) if not is_shown]
+            if batch:
+                push_candidates(user_id, batch)
+                return len(batch)
+
+        cursor = r.get(cursor_key(user_id))
+        user = next(iter(get_profiles([str(user_id)])), None)
+
+        # Сначала берём кандидатов с общими интересами из обратного индекса, затем
+        # обходим /users постранично с того места, где остановились в прошлый раз,
+        # и добираем пул непоказанных кандидатов для ранжирования
+        pool = interest_candidates(user, queued)
+        queued |= {str(u["user_id"]) for u in pool}
+        for _ in range(MAX_REFILL_PAGES):
+            users, cursor = get_users_page(user_id, cursor)
+            users = [u for u in users if str(u["user_id"]) not in queued]
+            if users:
+                shown = seen.contains_many(user_id, [str(u["user_id"]) for u in users])
+                pool.extend(u for u, is_shown in zip(users, shown) if not is_shown)
+            if len(pool) >= RANK_POOL_SIZE or cursor is None:
+                break
+
+        if cursor:
+            r.set(cursor_key(user_id), cursor, ex=QUEUE_TTL)
+        else:
+            r.delete(cursor_key(user_id))
+
+        # Курсор уже ушёл за весь пул, поэтому ранжируем его целиком: лучшие идут в очередь,
+        # остальные - в запас, из которого берётся следующая пачка
+        ranked = rank_candidates(user_id, user, pool, len(pool))
+        batch = ranked[:QUEUE_BATCH_SIZE]
+        push_candidates(user_id, batch, ranked[QUEUE_BATCH_SIZE:])
+        return len(batch)
+    finally:
+        r.delete(lock_key)
+
+
+def push_candidates(user_id, batch, spill=()):
+    if not batch:
+        return
+    pipe = r.pipeline()
+    pipe.rpush(queue_key(user_id), *batch)
+    pipe.expire(queue_key(user_id), QUEUE_TTL)
+    if spill:
+        pipe.rpush(spill_key(user_id), *spill)
+        pipe.expire(spill_key(user_id), QUEUE_TTL)
+    pipe.execute()
+
+
+def pop_candidates(user_id, limit):
+    ids = r.lpop(queue_key(user_id), limit)
+    return ids or []
+
+
+def mark_seen(user_id, ids):
+    seen.add_many(user_id, [str(i) for i in ids])
+
+
+def find_matches(user_id, limit=1, mark_as_seen=True):
+    """
+    Следующие кандидаты из очереди. С mark_as_seen=False кандидаты не отмечаются показанными:
+    так их забирает колода шлюза, которая отмечает анкету через /seen, когда отправит её.
+    """
+    limit = max(1, min(limit, MAX_MATCH_LIMIT))
+    refilled = False
+
+    matches = []
+    while len(matches) < limit:
+        ids = pop_candidates(user_id, limit - len(matches))
+        if not ids:
+            # Очередь пуста: один раз дозаполняем синхронно, дальше ждём фоновый рефиллер.
+            # Если рефилл уже идёт в фоне, ждём его, а не отвечаем "нет анкет"
+            if refilled or not (refill_queue(user_id) or wait_for_refill(user_id)):
+                break
+            refilled = True
+            continue
+        # Кандидат мог попасть в очередь повторно, пока лежал в колоде шлюза неотправленным
+        shown = seen.contains_many(user_id, ids)
+        profiles = get_profiles([i for i, is_shown in zip(ids, shown) if not is_shown])
+        # Показанными отмечаем только отданные анкеты: при ошибке user_service кандидаты
+        # не прячутся на 2*SEEN_TTL и снова попадут в выдачу при следующем обходе
+        if mark_as_seen:
+            seen.add_many(user_id, [str(p["user_id"]) for p in profiles])
+        matches.extend(profiles)
+
+    return matches
+
+
+def find_nearby(user_id, radius_km, limit=1):
+    """Ближайшие непоказанные кандидаты в радиусе radius_km по гео-индексу user_service."""
+    limit = max(1, min(limit, MAX_MATCH_LIMIT))
+    count = limit * 4
+
+    while True:
+        try:
+            nearby = r.geosearch(
+                GEO_KEY,
+                member=str(user_id),
+                radius=radius_km,
+                unit="km",
+                sort="ASC",
+                count=count,
+                withdist=True,
+            )
+        except redis.ResponseError:
+            # Пользователя ещё нет в гео-индексе
+            return []
+
+        candidates = [(member, dist) for member, dist in nearby if member != str(user_id)]
+        if candidates:
+            shown = seen.contains_many(user_id, [member for member, _ in candidates])
+            candidates = [c for c, is_shown in zip(candidates, shown) if not is_shown]
 
-def find_matches(user_id):
-    all_users = get_users(user_id)
-    key = f"shown_user_ids:{user_id}"
-    shown_ids = r.smembers(key)
+        if len(candidates) >= limit or len(nearby) < count or count >= MAX_GEO_SCAN:
+            break
+        count = min(count * 2, MAX_GEO_SCAN)
 
-    for user in all_users:
-        if str(user["user_id"]) not in shown_ids:
-            r.sadd(key, user["user_id"])
-            return [user]
+    distances = dict(candidates[:limit])
+    matches = get_profiles(list(distances))
+    for profile in matches:
+        profile["distance_km"] = round(distances[profile["user_id"]], 1)
 
-    return []
+    seen.add_many(user_id, [m["user_id"] for m in matches])
+    return matches
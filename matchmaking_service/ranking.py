@@ -0,0 +1,63 @@
+import heapq
+import math
+
+ELO_DEFAULT = 1000.0
+
+# Веса составляющих итогового скора кандидата
+WEIGHT_RATING = 1.0
+WEIGHT_INTERESTS = 2.0
+WEIGHT_AGE = 1.0
+WEIGHT_DISTANCE = 1.5
+
+RATING_SCALE = 200.0
+AGE_SCALE = 5.0
+DISTANCE_SCALE_KM = 25.0
+EARTH_RADIUS_KM = 6371.0
+
+
+def interest_tokens(profile):
+    """ID нормализованных интересов из user_service; для старых анкет без них - сами строки."""
+    if profile.get("interest_ids"):
+        return frozenset(profile["interest_ids"])
+    return frozenset(i.strip().lower() for i in profile.get("interests") or [] if i.strip())
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class CandidateRanker:
+    """Оценивает кандидатов относительно одного пользователя; признаки пользователя считаются один раз."""
+
+    def __init__(self, user, user_rating=None):
+        self.user = user
+        self.rating = user_rating if user_rating is not None else ELO_DEFAULT
+        self.interests = interest_tokens(user)
+
+    def score(self, candidate, candidate_rating=None):
+        candidate_rating = candidate_rating if candidate_rating is not None else ELO_DEFAULT
+        score = WEIGHT_RATING / (1 + abs(self.rating - candidate_rating) / RATING_SCALE)
+
+        candidate_interests = interest_tokens(candidate)
+        if self.interests and candidate_interests:
+            overlap = len(self.interests & candidate_interests)
+            score += WEIGHT_INTERESTS * overlap / len(self.interests | candidate_interests)
+
+        score += WEIGHT_AGE * math.exp(-abs(self.user["age"] - candidate["age"]) / AGE_SCALE)
+
+        distance = distance_km(
+            self.user["latitude"], self.user["longitude"],
+            candidate["latitude"], candidate["longitude"],
+        )
+        score += WEIGHT_DISTANCE * math.exp(-distance / DISTANCE_SCALE_KM)
+        return score
+
+    def top(self, candidates, ratings, k):
+        """Лучшие k кандидатов через кучу, без полной сортировки пула."""
+        scored = (
+            (self.score(c, ratings.get(str(c["user_id"]))), str(c["user_id"]))
+            for c in candidates
+        )
+        return [user_id for _, user_id in heapq.nlargest(k, scored)]
@@ -0,0 +1,67 @@
+import os
+import time
+import hashlib
+
+# Параметры фильтра Блума: при 2^17 битах (16 КБ) и 7 хэшах на 10 000 показанных
+# анкет доля ложных срабатываний около 0.2%.
+SEEN_BITS = int(os.getenv("SEEN_FILTER_BITS", 2 ** 17))
+SEEN_HASHES = int(os.getenv("SEEN_FILTER_HASHES", 7))
+# Фильтр ротируется поколениями: показанная анкета снова может попасть в выдачу
+# через SEEN_TTL-2*SEEN_TTL секунд.
+SEEN_TTL = int(os.getenv("SEEN_TTL", 60 * 60 * 24 * 30))
+
+
+def seen_key(keyspace, user_id, generation):
+    return keyspace.key("seen", user_id, generation)
+
+
+def bit_positions(member):
+    digest = hashlib.blake2b(str(member).encode(), digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], "little")
+    h2 = int.from_bytes(digest[8:], "little") | 1
+    return [(h1 + i * h2) % SEEN_BITS for i in range(SEEN_HASHES)]
+
+
+class SeenFilter:
+    """Множество показанных анкет пользователя фиксированного размера: Bloom-фильтр поверх битовой строки Redis."""
+
+    def __init__(self, r, keyspace):
+        self.r = r
+        self.keyspace = keyspace
+
+    def _generation(self):
+        return int(time.time() // SEEN_TTL)
+
+    def add_many(self, user_id, members):
+        if not members:
+            return
+        key = seen_key(self.keyspace, user_id, self._generation())
+        args = []
+        for member in members:
+            for pos in bit_positions(member):
+                args += ["SET", "u1", pos, 1]
+        pipe = self.r.pipeline(transaction=False)
+        pipe.execute_command("BITFIELD", key, *args)
+        pipe.expire(key, SEEN_TTL * 2)
+        pipe.execute()
+
+    def contains_many(self, user_id, members):
+        """Проверка принадлежности на стороне Redis: одна команда на поколение, ответ - k бит на анкету."""
+        if not members:
+            return []
+        generation = self._generation()
+        args = []
+        for member in members:
+            for pos in bit_positions(member):
+                args += ["GET", "u1", pos]
+
+        pipe = self.r.pipeline(transaction=False)
+        for g in (generation, generation - 1):
+            pipe.execute_command("BITFIELD_RO", seen_key(self.keyspace, user_id, g), *args)
+        current, previous = pipe.execute()
+
+        result = []
+        for i in range(len(members)):
+            bits = slice(i * SEEN_HASHES, (i + 1) * SEEN_HASHES)
+            result.append(all(current[bits]) or all(previous[bits]))
+        return result
@@ -0,0 +1,30 @@
+import os
+import sys
+import pytest
+import fakeredis
+import redis.client
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import matcher  # noqa: E402
+
+
+def _with_bitfield_ro(execute_command):
+    # fakeredis не знает BITFIELD_RO; BITFIELD только с GET делает то же самое
+    def wrapper(self, *args, **kwargs):
+        if args and args[0] == "BITFIELD_RO":
+            args = ("BITFIELD",) + args[1:]
+        return execute_command(self, *args, **kwargs)
+    return wrapper
+
+
+@pytest.fixture
+def redis_client(monkeypatch):
+    monkeypatch.setattr(redis.client.Redis, "execute_command", _with_bitfield_ro(redis.client.Redis.execute_command))
+    monkeypatch.setattr(redis.client.Pipeline, "execute_command", _with_bitfield_ro(redis.client.Pipeline.execute_command))
+    r = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(matcher, "r", r)
+    monkeypatch.setattr(matcher.keyspace, "r", r)
+    monkeypatch.setattr(matcher.keyspace, "_epoch", None)
+    monkeypatch.setattr(matcher.seen, "r", r)
+    return r
@@ -0,0 +1,29 @@
+import matcher
+
+
+def fake_profiles(ids):
+    return [{"user_id": i} for i in ids]
+
+
+def test_candidates_are_ordered_by_shared_interests(redis_client, monkeypatch):
+    monkeypatch.setattr(matcher, "get_profiles", fake_profiles)
+    redis_client.sadd("interest:1:users", "me", "a", "b", "c")
+    redis_client.sadd("interest:2:users", "me", "b", "c")
+    redis_client.sadd("interest:3:users", "me", "c")
+    matcher.seen.add_many("me", ["b"])
+
+    user = {"user_id": "me", "interest_ids": [1, 2, 3]}
+    assert matcher.interest_candidates(user, exclude={"a"}) == [{"user_id": "c"}]
+
+    user = {"user_id": "me", "interest_ids": [1, 2, 3]}
+    assert [p["user_id"] for p in matcher.interest_candidates(user, exclude=set())] == ["c", "a"]
+
+
+def test_popular_interest_is_sampled(redis_client, monkeypatch):
+    monkeypatch.setattr(matcher, "get_profiles", fake_profiles)
+    monkeypatch.setattr(matcher, "INTEREST_POSTING_SAMPLE", 10)
+    monkeypatch.setattr(matcher, "INTEREST_POOL_SIZE", 1000)
+    redis_client.sadd("interest:1:users", *[str(i) for i in range(500)])
+
+    candidates = matcher.interest_candidates({"user_id": "me", "interest_ids": [1]}, exclude=set())
+    assert len(candidates) == 10
@@ -0,0 +1,55 @@
+import matcher
+from ranking import CandidateRanker
+
+
+def profile(user_id, gender="m"):
+    return {"user_id": user_id, "gender": gender, "age": 25, "latitude": 0.0, "longitude": 0.0, "interests": []}
+
+
+def test_ranked_leftovers_are_kept_for_next_refill(redis_client, monkeypatch):
+    users = [profile(str(i)) for i in range(1, 8)]
+    pages = iter([(users, None)])
+    monkeypatch.setattr(matcher, "QUEUE_BATCH_SIZE", 3)
+    monkeypatch.setattr(matcher, "get_users_page", lambda user_id, cursor: next(pages, ([], None)))
+    monkeypatch.setattr(matcher, "get_profiles", lambda ids: [profile(i) for i in ids])
+
+    assert matcher.refill_queue("me") == 3
+    first = redis_client.lrange(matcher.queue_key("me"), 0, -1)
+    redis_client.delete(matcher.queue_key("me"))
+
+    # Второе пополнение берёт оставшихся из запаса, а не следующую страницу
+    assert matcher.refill_queue("me") == 3
+    assert matcher.refill_queue("me") == 1
+    queued = first + redis_client.lrange(matcher.queue_key("me"), 0, -1)
+    assert sorted(queued, key=int) == [u["user_id"] for u in users]
+
+
+def test_gender_does_not_change_score():
+    ranker = CandidateRanker(profile("me", "m"))
+    assert ranker.score(profile("a", "m")) == ranker.score(profile("a", "f"))
+
+
+def test_empty_queue_waits_for_background_refill(redis_client, monkeypatch):
+    monkeypatch.setattr(matcher, "get_profiles", lambda ids: [profile(i) for i in ids])
+    redis_client.set(matcher.refill_lock_key("me"), 1)
+    waits = []
+
+    def background_refill(delay):
+        # Фоновый рефиллер заканчивает работу, пока синхронный запрос ждёт
+        waits.append(delay)
+        redis_client.rpush(matcher.queue_key("me"), "5")
+        redis_client.delete(matcher.refill_lock_key("me"))
+
+    monkeypatch.setattr(matcher.time, "sleep", background_refill)
+    assert [p["user_id"] for p in matcher.find_matches("me")] == ["5"]
+    assert waits
+
+
+def test_candidates_are_not_marked_seen_when_profiles_fail_to_load(redis_client, monkeypatch):
+    monkeypatch.setattr(matcher, "refill_queue", lambda user_id: 0)
+    monkeypatch.setattr(matcher, "wait_for_refill", lambda user_id: 0)
+    redis_client.rpush(matcher.queue_key("me"), "1", "2")
+    monkeypatch.setattr(matcher, "get_profiles", lambda ids: [profile(i) for i in ids if i == "1"])
+
+    assert [p["user_id"] for p in matcher.find_matches("me", limit=2)] == ["1"]
+    assert matcher.seen.contains_many("me", ["1", "2"]) == [True, False]
@@ -0,0 +1,30 @@
+import seen as seen_module
+import matcher
+
+
+def test_added_members_are_seen_and_others_are_not(redis_client):
+    matcher.seen.add_many("me", [str(i) for i in range(100)])
+
+    assert matcher.seen.contains_many("me", [str(i) for i in range(100)]) == [True] * 100
+    unseen = matcher.seen.contains_many("me", [str(i) for i in range(1000, 1100)])
+    # При 100 элементах в фильтре ложные срабатывания практически исключены
+    assert sum(unseen) <= 1
+    assert matcher.seen.contains_many("other", ["1"]) == [False]
+
+
+def test_previous_generation_is_still_checked(redis_client, monkeypatch):
+    monkeypatch.setattr(seen_module.time, "time", lambda: seen_module.SEEN_TTL * 10)
+    matcher.seen.add_many("me", ["a"])
+
+    monkeypatch.setattr(seen_module.time, "time", lambda: seen_module.SEEN_TTL * 11)
+    assert matcher.seen.contains_many("me", ["a"]) == [True]
+
+    monkeypatch.setattr(seen_module.time, "time", lambda: seen_module.SEEN_TTL * 12)
+    assert matcher.seen.contains_many("me", ["a"]) == [False]
+
+
+def test_bit_positions_are_stable_and_in_range():
+    positions = seen_module.bit_positions("42")
+    assert positions == seen_module.bit_positions(42)
+    assert len(positions) == seen_module.SEEN_HASHES
+    assert all(0 <= p < seen_module.SEEN_BITS for p in positions)
@@ -0,0 +1,114 @@
+import os
+import time
+import socket
+import asyncio
+import logging
+import redis.asyncio as redis
+
+logger = logging.getLogger(__name__)
+
+VOTE_EVENTS_STREAM = "vote_events"
+ELO_RATINGS_KEY = "elo_ratings"
+CONSUMER_GROUP = "rating_elo"
+CONSUMER_NAME = os.getenv("HOSTNAME", socket.gethostname()) + f":{os.getpid()}"
+
+ELO_DEFAULT = float(os.getenv("ELO_DEFAULT", 1000))
+ELO_K = float(os.getenv("ELO_K", 32))
+EVENTS_BATCH_SIZE = 100
+# Имя потребителя меняется при пересоздании контейнера, поэтому события, выданные
+# прежнему потребителю и не подтверждённые дольше CLAIM_IDLE_MS, забирает живой
+CLAIM_IDLE_MS = 60000
+CLAIM_INTERVAL = 10
+# Отметка об учтённом событии голоса; живёт дольше, чем событие может ждать повторной доставки
+PROCESSED_KEY = "elo_processed:{event_id}"
+PROCESSED_TTL = int(os.getenv("ELO_PROCESSED_TTL", 60 * 60 * 24))
+
+# Голос - это "партия" анкеты против голосующего: лайк - победа анкеты, дизлайк - поражение.
+# Ожидаемый результат зависит от рейтинга голосующего, поэтому лайк от сильного
+# голосующего поднимает анкету больше, а дизлайк от слабого - сильнее опускает.
+# Если задан KEYS[2], голос учитывается только при первой отметке события: повторная доставка
+# после падения между применением и XACK рейтинг не меняет.
+APPLY_VOTE_LUA = """
+if KEYS[2] and not redis.call('SET', KEYS[2], 1, 'NX', 'EX', ARGV[6]) then
+    return false
+end
+local voter = tonumber(redis.call('ZSCORE', KEYS[1], ARGV[1]) or ARGV[4])
+local target = tonumber(redis.call('ZSCORE', KEYS[1], ARGV[2]) or ARGV[4])
+local outcome = 0
+if ARGV[3] == 'like' then outcome = 1 end
+local expected = 1 / (1 + 10 ^ ((voter - target) / 400))
+local updated = target + tonumber(ARGV[5]) * (outcome - expected)
+redis.call('ZADD', KEYS[1], updated, ARGV[2])
+return tostring(updated)
+"""
+
+
+class EloEngine:
+    def __init__(self, r: redis.Redis):
+        self.r = r
+        self.apply_vote_script = r.register_script(APPLY_VOTE_LUA)
+        self.claim_cursor = "0-0"
+
+    async def apply_vote(self, voter_id, target_id, vote, event_id=None, pipe=None):
+        keys = [ELO_RATINGS_KEY]
+        if event_id is not None:
+            keys.append(PROCESSED_KEY.format(event_id=event_id))
+        return await self.apply_vote_script(
+            keys=keys,
+            args=[voter_id, target_id, vote, ELO_DEFAULT, ELO_K, PROCESSED_TTL],
+            client=pipe,
+        )
+
+    async def ensure_group(self):
+        try:
+            await self.r.xgroup_create(VOTE_EVENTS_STREAM, CONSUMER_GROUP, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def process(self, messages):
+        if not messages:
+            return 0
+        pipe = self.r.pipeline(transaction=False)
+        for message_id, fields in messages:
+            await self.apply_vote(fields["voter"], fields["target"], fields["vote"], event_id=message_id, pipe=pipe)
+        pipe.xack(VOTE_EVENTS_STREAM, CONSUMER_GROUP, *[message_id for message_id, _ in messages])
+        await pipe.execute()
+        return len(messages)
+
+    async def consume(self):
+        """Читает события голосов из стрима и обновляет рейтинги, по O(1) на голос."""
+        await self.ensure_group()
+        # Сначала дочитываем то, что было выдано этому потребителю, но не подтверждено
+        last_id = "0"
+        next_claim = time.monotonic() + CLAIM_INTERVAL
+        while True:
+            try:
+                if time.monotonic() >= next_claim:
+                    next_claim = time.monotonic() + CLAIM_INTERVAL
+                    await self.process(await self.claim_stale())
+
+                response = await self.r.xreadgroup(
+                    CONSUMER_GROUP, CONSUMER_NAME,
+                    {VOTE_EVENTS_STREAM: last_id},
+                    count=EVENTS_BATCH_SIZE,
+                    block=5000 if last_id == ">" else None,
+                )
+                messages = response[0][1] if response else []
+                if last_id == "0" and not messages:
+                    last_id = ">"
+                    continue
+                await self.process(messages)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Ошибка обработки событий голосов")
+                await asyncio.sleep(1)
+
+    async def claim_stale(self):
+        """Забирает зависшие у других потребителей события; курсор переживает вызовы."""
+        self.claim_cursor, messages, *_ = await self.r.xautoclaim(
+            VOTE_EVENTS_STREAM, CONSUMER_GROUP, CONSUMER_NAME,
+            min_idle_time=CLAIM_IDLE_MS, start_id=self.claim_cursor, count=EVENTS_BATCH_SIZE,
+        )
+        return messages
@@ -1,9 +1,19 @@
-from fastapi import FastAPI, Request
-from tasks import calculate_rating
+import asyncio
+import redis.asyncio as redis
+from fastapi import FastAPI, HTTPException, Query
+from ratings import (
+    REDIS_HOST, REDIS_PORT, RATINGS_KEY, RATING_HASHES_KEY,
+    EPOCH_KEY, likes_received_key, votes_key, profile_hash, score_profile,
+)
+from elo import EloEngine, ELO_RATINGS_KEY
 from pydantic import BaseModel
 from typing import List, Optional
 
+MAX_BULK_IDS = 1000
+
 app = FastAPI()
+r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+elo = EloEngine(r)
 
 class Profile(BaseModel):
     user_id: str
@@ -17,8 +27,61 @@ class Profile(BaseModel):
     longitude: float
     username: Optional[str] = None
 
+@app.on_event("startup")
+async def on_startup():
+    app.state.elo_consumer = asyncio.create_task(elo.consume())
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    app.state.elo_consumer.cancel()
+
 @app.post("/rate")
-async def rate(request: Request):
-    profile = await request.json()
-    task = calculate_rating.delay(profile)
-    return {"task_id": task.id}
+async def rate(profile: Profile):
+    data = profile.dict()
+    content_hash = profile_hash(data)
+
+    # Пересчитываем только если анкета изменилась с прошлого расчёта
+    epoch = int(await r.get(EPOCH_KEY) or 0)
+    pipe = r.pipeline()
+    pipe.hget(RATING_HASHES_KEY, profile.user_id)
+    pipe.hget(RATINGS_KEY, profile.user_id)
+    pipe.hget(likes_received_key(epoch), profile.user_id)
+    pipe.hlen(votes_key(epoch, profile.user_id))
+    cached_hash, cached_rating, likes, votes = await pipe.execute()
+    if cached_hash == content_hash and cached_rating is not None:
+        return {"user_id": profile.user_id, "rating": float(cached_rating)}
+
+    rating = score_profile(data, int(likes or 0), votes)
+    pipe = r.pipeline()
+    pipe.hset(RATINGS_KEY, profile.user_id, rating)
+    pipe.hset(RATING_HASHES_KEY, profile.user_id, content_hash)
+    await pipe.execute()
+    return {"user_id": profile.user_id, "rating": float(rating)}
+
+@app.get("/rating/{user_id}")
+async def get_rating(user_id: str):
+    rating = await r.hget(RATINGS_KEY, user_id)
+    if rating is None:
+        raise HTTPException(status_code=404, detail="Rating not found")
+    return {"user_id": user_id, "rating": float(rating)}
+
+@app.get("/ratings")
+async def get_ratings(ids: str = Query(..., description="user_id через запятую")):
+    user_ids = list(dict.fromkeys(i for i in ids.split(",") if i))
+    if len(user_ids) > MAX_BULK_IDS:
+        raise HTTPException(status_code=400, detail="Too many ids")
+    if not user_ids:
+        return {}
+    ratings = await r.hmget(RATINGS_KEY, user_ids)
+    return {uid: float(rating) for uid, rating in zip(user_ids, ratings) if rating is not None}
+
+
+@app.get("/elo")
+async def get_elo(ids: str = Query(..., description="user_id через запятую")):
+    user_ids = list(dict.fromkeys(i for i in ids.split(",") if i))
+    if len(user_ids) > MAX_BULK_IDS:
+        raise HTTPException(status_code=400, detail="Too many ids")
+    if not user_ids:
+        return {}
+    scores = await r.zmscore(ELO_RATINGS_KEY, user_ids)
+    return {uid: score for uid, score in zip(user_ids, scores) if score is not None}
@@ -0,0 +1,72 @@
+import os
+import json
+import hashlib
+import numpy as np
+
+REDIS_HOST = os.getenv("REDIS_HOST", "redis")
+REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
+
+# user_id -> рейтинг и user_id -> хэш анкеты, по которой он посчитан
+RATINGS_KEY = "ratings"
+RATING_HASHES_KEY = "rating_hashes"
+# Голоса и лайки живут в пространстве ключей шлюза с префиксом поколения e{epoch}:
+EPOCH_KEY = "keyspace:epoch"
+
+# Вес поведенческой части рейтинга и масштабы насыщения для лайков и активности
+BEHAVIOUR_WEIGHT = 0.4
+LIKES_SCALE = 10.0
+VOTES_SCALE = 50.0
+
+
+def likes_received_key(epoch):
+    """Хэш user_id -> число полученных лайков, его ведёт скрипт голосования шлюза."""
+    return f"e{epoch}:likes_received"
+
+
+def votes_key(epoch, user_id):
+    return f"e{epoch}:votes:{user_id}"
+
+
+# Поля анкеты, от которых зависит рейтинг. Хэш строится только по ним, чтобы /rate (анкета
+# от шлюза) и массовый пересчёт (анкета из user_service с интересами в виде ID и т.п.)
+# получали одинаковый хэш для одной и той же анкеты.
+HASHED_FIELDS = ("photos", "interests", "city")
+
+
+def profile_hash(profile):
+    payload = json.dumps(
+        {field: profile.get(field) or None for field in HASHED_FIELDS},
+        sort_keys=True, ensure_ascii=False, default=str,
+    )
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def score_profiles(photos, interests, has_city, likes, votes):
+    """
+    Векторный расчёт рейтинга по столбцам признаков.
+
+    Первый уровень - заполненность анкеты (фото, интересы, город), второй -
+    поведение: сколько лайков получено и насколько активно пользователь голосует.
+    """
+    photos = np.asarray(photos, dtype=np.float64)
+    interests = np.asarray(interests, dtype=np.float64)
+    has_city = np.asarray(has_city, dtype=np.float64)
+    likes = np.asarray(likes, dtype=np.float64)
+    votes = np.asarray(votes, dtype=np.float64)
+
+    base = np.minimum(photos * 10 + np.minimum(interests, 5) * 5 + has_city * 5, 100)
+    behaviour = 100 * (0.8 * -np.expm1(-likes / LIKES_SCALE) + 0.2 * -np.expm1(-votes / VOTES_SCALE))
+    return np.round((1 - BEHAVIOUR_WEIGHT) * base + BEHAVIOUR_WEIGHT * behaviour, 1)
+
+
+def profile_columns(profiles):
+    n = len(profiles)
+    photos = np.fromiter((len(p.get("photos") or []) for p in profiles), dtype=np.int32, count=n)
+    interests = np.fromiter((len(p.get("interests") or []) for p in profiles), dtype=np.int32, count=n)
+    has_city = np.fromiter((bool(p.get("city")) for p in profiles), dtype=np.bool_, count=n)
+    return photos, interests, has_city
+
+
+def score_profile(profile, likes=0, votes=0):
+    photos, interests, has_city = profile_columns([profile])
+    return float(score_profiles(photos, interests, has_city, [likes], [votes])[0])
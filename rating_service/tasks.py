@@ -1,16 +1,72 @@
+import os
+import json
+import logging
+import redis
+import requests
 from celery import shared_task
+from ratings import (
+    REDIS_HOST, REDIS_PORT, RATINGS_KEY, RATING_HASHES_KEY,
+    EPOCH_KEY, likes_received_key, votes_key, profile_hash, profile_columns, score_profile, score_profiles,
+)
+
+USER_SERVICE_URL = os.getenv("USER_SERVICE_URL", "http://user_service:8000")
+RECALC_CHUNK_SIZE = int(os.getenv("RATING_RECALC_CHUNK_SIZE", 1000))
+
+logger = logging.getLogger(__name__)
+r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+
+def behaviour_counts(user_ids):
+    """Лайки, полученные каждым пользователем, и число его собственных голосов - одним конвейером."""
+    epoch = int(r.get(EPOCH_KEY) or 0)
+    pipe = r.pipeline(transaction=False)
+    pipe.hmget(likes_received_key(epoch), user_ids)
+    for user_id in user_ids:
+        pipe.hlen(votes_key(epoch, user_id))
+    likes, *votes = pipe.execute()
+    return [int(n or 0) for n in likes], votes
+
+def iter_profile_chunks(chunk_size):
+    with requests.get(f"{USER_SERVICE_URL}/users/stream", stream=True, timeout=(5, 60)) as resp:
+        resp.raise_for_status()
+        chunk = []
+        for line in resp.iter_lines():
+            if not line:
+                continue
+            chunk.append(json.loads(line))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+def rate_chunk(profiles):
+    user_ids = [p["user_id"] for p in profiles]
+    likes, votes = behaviour_counts(user_ids)
+    ratings = score_profiles(*profile_columns(profiles), likes, votes)
+
+    pipe = r.pipeline(transaction=False)
+    pipe.hset(RATINGS_KEY, mapping=dict(zip(user_ids, ratings.tolist())))
+    pipe.hset(RATING_HASHES_KEY, mapping={p["user_id"]: profile_hash(p) for p in profiles})
+    pipe.execute()
+    return len(user_ids)
 
 @shared_task(name="calculate_rating")
 def calculate_rating(profile):
-    rating = 0
-
-    if profile.get("photos"):
-        rating += len(profile["photos"]) * 10
+    (likes,), (votes,) = behaviour_counts([profile["user_id"]])
+    rating = score_profile(profile, likes, votes)
 
-    if profile.get("interests"):
-        rating += min(len(profile["interests"]), 5) * 5
+    pipe = r.pipeline()
+    pipe.hset(RATINGS_KEY, profile["user_id"], rating)
+    pipe.hset(RATING_HASHES_KEY, profile["user_id"], profile_hash(profile))
+    pipe.execute()
 
-    if profile.get("city"):
-        rating += 5
+    return {"rating": rating}
 
-    return {"rating": min(rating, 100)}
+@shared_task(name="recalculate_ratings")
+def recalculate_ratings():
+    """Периодический пересчёт рейтингов всей базы пачками по RECALC_CHUNK_SIZE анкет."""
+    total = 0
+    for chunk in iter_profile_chunks(RECALC_CHUNK_SIZE):
+        total += rate_chunk(chunk)
+    logger.info(f"Пересчитано рейтингов: {total}")
+    return {"rated": total}
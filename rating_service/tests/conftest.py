@@ -0,0 +1,13 @@
+import os
+import sys
+import importlib
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# celery.py сервиса перекрывает пакет celery; как и CLI воркера, загружаем пакет первым
+_path = sys.path[:]
+sys.path[:] = [p for p in sys.path if os.path.abspath(p or os.curdir) != SERVICE_DIR]
+importlib.import_module("celery")
+sys.path[:] = _path
+
+sys.path.insert(0, SERVICE_DIR)
@@ -0,0 +1,43 @@
+import asyncio
+import fakeredis.aioredis
+import elo
+from elo import EloEngine, ELO_RATINGS_KEY, VOTE_EVENTS_STREAM, CONSUMER_GROUP
+
+
+def test_redelivered_vote_is_applied_once():
+    async def scenario():
+        r = fakeredis.aioredis.FakeRedis(decode_responses=True)
+        engine = EloEngine(r)
+        await engine.ensure_group()
+        await r.xadd(VOTE_EVENTS_STREAM, {"voter": "1", "target": "2", "vote": "like"})
+        messages = (await r.xreadgroup(CONSUMER_GROUP, "c", {VOTE_EVENTS_STREAM: ">"}))[0][1]
+
+        await engine.process(messages)
+        rating = await r.zscore(ELO_RATINGS_KEY, "2")
+        # Процесс упал до XACK: то же событие приходит повторно
+        await engine.process(messages)
+        return rating, await r.zscore(ELO_RATINGS_KEY, "2")
+
+    first, second = asyncio.run(scenario())
+    assert first == 1016
+    assert second == first
+
+
+def test_events_of_dead_consumer_are_claimed(monkeypatch):
+    monkeypatch.setattr(elo, "CLAIM_IDLE_MS", 0)
+
+    async def scenario():
+        r = fakeredis.aioredis.FakeRedis(decode_responses=True)
+        engine = EloEngine(r)
+        await engine.ensure_group()
+        await r.xadd(VOTE_EVENTS_STREAM, {"voter": "1", "target": "2", "vote": "like"})
+        # Контейнер с прежним именем потребителя получил событие и был пересоздан
+        await r.xreadgroup(CONSUMER_GROUP, "old-host:1", {VOTE_EVENTS_STREAM: ">"})
+
+        await engine.process(await engine.claim_stale())
+        pending = await r.xpending(VOTE_EVENTS_STREAM, CONSUMER_GROUP)
+        return await r.zscore(ELO_RATINGS_KEY, "2"), pending["pending"]
+
+    rating, pending = asyncio.run(scenario())
+    assert rating == 1016
+    assert pending == 0
@@ -0,0 +1,18 @@
+from ratings import profile_hash, score_profile
+
+
+def test_hash_is_the_same_for_gateway_and_stored_profile():
+    sent_by_gateway = {
+        "user_id": "1", "name": "Аня", "age": 25, "gender": "female",
+        "interests": ["Футбол", "кино"], "city": "Москва",
+        "photos": ["http://minio/profile-photos/a.jpg"],
+        "latitude": 55.7, "longitude": 37.6, "username": None,
+    }
+    stored = {**sent_by_gateway, "username": "anya", "interest_ids": [1, 2]}
+    assert profile_hash(sent_by_gateway) == profile_hash(stored)
+    assert profile_hash(stored) != profile_hash({**stored, "city": "Казань"})
+
+
+def test_behaviour_raises_rating():
+    profile = {"photos": ["a"], "interests": ["x"], "city": "Москва"}
+    assert score_profile(profile, likes=10, votes=10) > score_profile(profile)
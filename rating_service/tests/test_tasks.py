@@ -0,0 +1,48 @@
+import fakeredis
+import tasks
+from ratings import RATINGS_KEY, RATING_HASHES_KEY, EPOCH_KEY, likes_received_key, votes_key, profile_hash, score_profile
+
+
+def profile(user_id, photos=1, city="Москва"):
+    return {
+        "user_id": user_id, "name": "Имя", "age": 25, "gender": "female",
+        "interests": ["кино"], "city": city, "photos": [f"p{i}.jpg" for i in range(photos)],
+    }
+
+
+def test_rate_chunk_writes_ratings_and_hashes_for_behaviour_of_current_epoch(monkeypatch):
+    r = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(tasks, "r", r)
+    r.set(EPOCH_KEY, 2)
+    r.hset(likes_received_key(2), mapping={"1": 7})
+    r.hset(votes_key(2, "1"), mapping={"5": "like", "6": "dislike"})
+    # Голоса прошлого поколения не учитываются
+    r.hset(likes_received_key(1), mapping={"2": 100})
+
+    profiles = [profile("1", photos=3), profile("2", city="")]
+    assert tasks.rate_chunk(profiles) == 2
+
+    assert float(r.hget(RATINGS_KEY, "1")) == score_profile(profiles[0], likes=7, votes=2)
+    assert float(r.hget(RATINGS_KEY, "2")) == score_profile(profiles[1])
+    assert r.hgetall(RATING_HASHES_KEY) == {"1": profile_hash(profiles[0]), "2": profile_hash(profiles[1])}
+
+
+def test_profiles_are_streamed_in_chunks(monkeypatch):
+    class FakeResponse:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def raise_for_status(self):
+            pass
+
+        def iter_lines(self):
+            for i in range(5):
+                yield f'{{"user_id": "{i}"}}'.encode()
+                yield b""
+
+    monkeypatch.setattr(tasks.requests, "get", lambda *args, **kwargs: FakeResponse())
+    chunks = [[p["user_id"] for p in chunk] for chunk in tasks.iter_profile_chunks(2)]
+    assert chunks == [["0", "1"], ["2", "3"], ["4"]]
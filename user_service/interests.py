@@ -0,0 +1,101 @@
+import re
+
+INTEREST_IDS_KEY = "interest_ids"
+INTEREST_SEQ_KEY = "interest_ids:seq"
+
+# Синонимы и переводы сводятся к одному каноническому названию интереса
+SYNONYMS = {
+    "футбол": "football", "soccer": "football",
+    "баскетбол": "basketball",
+    "волейбол": "volleyball",
+    "хоккей": "hockey",
+    "теннис": "tennis",
+    "бег": "running", "пробежки": "running", "jogging": "running",
+    "спорт": "sport", "sports": "sport",
+    "фитнес": "fitness", "спортзал": "fitness", "зал": "fitness", "gym": "fitness",
+    "йога": "yoga",
+    "плавание": "swimming", "бассейн": "swimming",
+    "велосипед": "cycling", "велоспорт": "cycling", "bike": "cycling",
+    "лыжи": "skiing", "ski": "skiing",
+    "сноуборд": "snowboarding", "snowboard": "snowboarding",
+    "танцы": "dancing", "dance": "dancing",
+    "музыка": "music",
+    "гитара": "guitar",
+    "кино": "movies", "фильмы": "movies", "cinema": "movies", "films": "movies",
+    "сериалы": "tv series", "series": "tv series",
+    "книги": "books", "чтение": "books", "reading": "books", "литература": "books",
+    "игры": "games", "видеоигры": "games", "gaming": "games", "video games": "games",
+    "путешествия": "travel", "travelling": "travel", "traveling": "travel",
+    "фото": "photography", "фотография": "photography", "photo": "photography",
+    "искусство": "art", "рисование": "drawing",
+    "кулинария": "cooking", "готовка": "cooking", "cook": "cooking",
+    "программирование": "programming", "coding": "programming", "it": "programming",
+    "природа": "nature",
+    "походы": "hiking", "туризм": "hiking", "hike": "hiking",
+    "животные": "animals", "собаки": "dogs", "кошки": "cats", "коты": "cats",
+    "наука": "science",
+    "психология": "psychology",
+    "автомобили": "cars", "машины": "cars", "авто": "cars",
+    "мода": "fashion",
+    "театр": "theatre", "theater": "theatre",
+    "аниме": "anime",
+    "шахматы": "chess",
+}
+
+_SPACES = re.compile(r"\s+")
+_TRIM = "#.,;:!?\"'«»()- "
+
+# Выдаёт каждому новому интересу следующий числовой ID; повторный вызов возвращает тот же ID
+ASSIGN_IDS_LUA = """
+local ids = {}
+for i, name in ipairs(ARGV) do
+    local id = redis.call('HGET', KEYS[1], name)
+    if not id then
+        id = redis.call('INCR', KEYS[2])
+        redis.call('HSET', KEYS[1], name, id)
+    end
+    ids[i] = tonumber(id)
+end
+return ids
+"""
+
+
+def interest_users_key(interest_id):
+    return f"interest:{interest_id}:users"
+
+
+def normalize_interest(text):
+    name = _SPACES.sub(" ", text.lower().replace("ё", "е")).strip(_TRIM)
+    return SYNONYMS.get(name, name)
+
+
+def normalize_interests(interests):
+    """Канонические названия интересов без пустых значений и повторов, в исходном порядке."""
+    names = (normalize_interest(i) for i in interests or [])
+    return list(dict.fromkeys(name for name in names if name))
+
+
+class InterestIndex:
+    """Словарь интересов (название -> ID) и обратный индекс ID интереса -> множество user_id в Redis."""
+
+    def __init__(self, r):
+        self.r = r
+        self.assign_script = r.register_script(ASSIGN_IDS_LUA)
+
+    async def ids(self, interests):
+        names = normalize_interests(interests)
+        if not names:
+            return []
+        return await self.assign_script(keys=[INTEREST_IDS_KEY, INTEREST_SEQ_KEY], args=names)
+
+    async def update(self, user_id, old_ids, new_ids):
+        removed = set(old_ids) - set(new_ids)
+        added = set(new_ids) - set(old_ids)
+        if not removed and not added:
+            return
+        pipe = self.r.pipeline(transaction=False)
+        for interest_id in removed:
+            pipe.srem(interest_users_key(interest_id), user_id)
+        for interest_id in added:
+            pipe.sadd(interest_users_key(interest_id), user_id)
+        await pipe.execute()
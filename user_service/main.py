@@ -1,10 +1,24 @@
-from fastapi import FastAPI, HTTPException
+import os
+import asyncio
+import json
+import redis.asyncio as redis
+from fastapi import FastAPI, HTTPException, Depends, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
+from storage import UserFilters, create_store
+from interests import InterestIndex
 
-app = FastAPI()
+REDIS_HOST = os.getenv("REDIS_HOST", "redis")
+REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
+GEO_KEY = "geo:users"
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
 
-profiles = {}
+app = FastAPI()
+r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+store = create_store()
+interest_index = InterestIndex(r)
 
 class ProfileCreate(BaseModel):
     user_id: str
@@ -18,18 +32,80 @@ class ProfileCreate(BaseModel):
     longitude: float
     username: Optional[str] = None
 
+def user_filters(
+    gender: Optional[str] = None,
+    min_age: Optional[int] = Query(None, ge=0),
+    max_age: Optional[int] = Query(None, ge=0),
+    city: Optional[str] = None,
+    exclude: List[str] = Query([]),
+):
+    return UserFilters(gender=gender, min_age=min_age, max_age=max_age, city=city, exclude=exclude)
+
+def validate_cursor(cursor):
+    if cursor and not cursor.isdigit():
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return cursor
+
+async def backfill_interest_ids():
+    """Переводит в ID интересы анкет, сохранённых до появления interest_ids, и добавляет их в индекс."""
+    count = 0
+    async for profile in store.stream_without_interest_ids():
+        profile["interest_ids"] = await interest_index.ids(profile["interests"])
+        await store.save(profile)
+        await interest_index.update(profile["user_id"], [], profile["interest_ids"])
+        count += 1
+    if count:
+        print(f"Интересы переведены в ID для {count} анкет")
+
+@app.on_event("startup")
+async def on_startup():
+    await store.init()
+    app.state.backfill = asyncio.create_task(backfill_interest_ids())
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await store.close()
+    await r.close()
+
 @app.post("/profile")
-def create_profile(profile: ProfileCreate):
-    profiles[profile.user_id] = profile.dict()
+async def create_profile(profile: ProfileCreate):
+    data = profile.dict()
+    data["interests"] = [i.strip() for i in data["interests"] or [] if i.strip()]
+    data["interest_ids"] = await interest_index.ids(data["interests"])
+
+    previous = await store.get(profile.user_id)
+    await store.save(data)
+    await interest_index.update(profile.user_id, (previous or {}).get("interest_ids") or [], data["interest_ids"])
+    await r.geoadd(GEO_KEY, (profile.longitude, profile.latitude, profile.user_id))
     return {"message": "Profile saved"}
 
 @app.get("/profile/{user_id}")
-def get_profile(user_id: str):
-    profile = profiles.get(user_id)
+async def get_profile(user_id: str):
+    profile = await store.get(user_id)
     if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")
     return profile
 
+@app.get("/profiles")
+async def get_profiles(ids: str = Query(..., description="user_id через запятую")):
+    user_ids = list(dict.fromkeys(i for i in ids.split(",") if i))
+    if len(user_ids) > MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail="Too many ids")
+    return await store.get_many(user_ids)
+
 @app.get("/users")
-def get_users():
-    return list(profiles.values())
\ No newline at end of file
+async def get_users(
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    filters: UserFilters = Depends(user_filters),
+):
+    items, next_cursor = await store.list_page(validate_cursor(cursor), limit, filters)
+    return {"items": items, "next_cursor": next_cursor}
+
+@app.get("/users/stream")
+async def stream_users(filters: UserFilters = Depends(user_filters)):
+    async def generate():
+        async for profile in store.stream(filters):
+            yield json.dumps(profile, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
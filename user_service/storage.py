@@ -0,0 +1,245 @@
+import os
+from abc import ABC, abstractmethod
+from itertools import islice
+from typing import List, Optional
+from pydantic import BaseModel
+from sqlalchemy import MetaData, Table, Column, Index, Integer, String, Float, JSON, func, select, inspect, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import create_async_engine
+
+PROFILE_STORE_URL = os.getenv("PROFILE_STORE_URL", "memory://")
+DB_POOL_SIZE = int(os.getenv("PROFILE_DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("PROFILE_DB_MAX_OVERFLOW", 20))
+STREAM_CHUNK_SIZE = 500
+
+
+class UserFilters(BaseModel):
+    gender: Optional[str] = None
+    min_age: Optional[int] = None
+    max_age: Optional[int] = None
+    city: Optional[str] = None
+    exclude: List[str] = []
+
+    def matches(self, profile):
+        if self.gender and profile["gender"] != self.gender:
+            return False
+        if self.min_age is not None and profile["age"] < self.min_age:
+            return False
+        if self.max_age is not None and profile["age"] > self.max_age:
+            return False
+        if self.city and profile["city"].lower() != self.city.lower():
+            return False
+        return profile["user_id"] not in self.exclude
+
+
+class ProfileStore(ABC):
+    """
+    Интерфейс хранилища анкет. Курсор - непрозрачная строка, задающая позицию в порядке регистрации.
+    По умолчанию (PROFILE_STORE_URL=memory://) анкеты живут в памяти процесса; в docker-compose
+    задан SQLite на томе profile_data.
+    """
+
+    async def init(self):
+        pass
+
+    async def close(self):
+        pass
+
+    @abstractmethod
+    async def save(self, profile: dict):
+        ...
+
+    @abstractmethod
+    async def get(self, user_id: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    async def get_many(self, user_ids: List[str]) -> List[dict]:
+        ...
+
+    @abstractmethod
+    async def list_page(self, cursor: Optional[str], limit: int, filters: UserFilters):
+        ...
+
+    @abstractmethod
+    def stream(self, filters: UserFilters):
+        ...
+
+    @abstractmethod
+    def stream_without_interest_ids(self):
+        """Анкеты, сохранённые до появления interest_ids, - для дозаполнения при старте."""
+
+
+class MemoryProfileStore(ProfileStore):
+    """Хранилище в памяти процесса: данные теряются при перезапуске и не разделяются между воркерами."""
+
+    def __init__(self):
+        self.profiles = {}
+
+    async def save(self, profile):
+        self.profiles[profile["user_id"]] = profile
+
+    async def get(self, user_id):
+        return self.profiles.get(user_id)
+
+    async def get_many(self, user_ids):
+        return [self.profiles[i] for i in user_ids if i in self.profiles]
+
+    async def list_page(self, cursor, limit, filters):
+        position = int(cursor) if cursor else 0
+        items = []
+        for profile in islice(self.profiles.values(), position, None):
+            position += 1
+            if filters.matches(profile):
+                items.append(profile)
+                if len(items) >= limit:
+                    break
+
+        next_cursor = str(position) if position < len(self.profiles) else None
+        return items, next_cursor
+
+    async def stream(self, filters):
+        for profile in list(self.profiles.values()):
+            if filters.matches(profile):
+                yield profile
+
+    async def stream_without_interest_ids(self):
+        for profile in list(self.profiles.values()):
+            if profile.get("interest_ids") is None:
+                yield profile
+
+
+class SQLProfileStore(ProfileStore):
+    """Хранилище в SQLite/PostgreSQL через асинхронный движок SQLAlchemy с пулом соединений."""
+
+    def __init__(self, url):
+        pool_options = {}
+        if not url.startswith("sqlite"):
+            pool_options = {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW, "pool_pre_ping": True}
+        self.engine = create_async_engine(url, **pool_options)
+
+        self.metadata = MetaData()
+        self.table = Table(
+            "profiles", self.metadata,
+            Column("id", Integer, primary_key=True, autoincrement=True),
+            Column("user_id", String(64), nullable=False, unique=True),
+            Column("name", String(255), nullable=False),
+            Column("age", Integer, nullable=False),
+            Column("gender", String(16), nullable=False),
+            Column("interests", JSON, nullable=False),
+            # NULL - интересы анкеты ещё не переведены в ID (анкета сохранена до появления столбца)
+            Column("interest_ids", JSON(none_as_null=True)),
+            Column("city", String(255), nullable=False),
+            Column("photos", JSON, nullable=False),
+            Column("latitude", Float, nullable=False),
+            Column("longitude", Float, nullable=False),
+            Column("username", String(255)),
+        )
+        Index("ix_profiles_gender_age", self.table.c.gender, self.table.c.age)
+        Index("ix_profiles_age", self.table.c.age)
+        Index("ix_profiles_city", func.lower(self.table.c.city))
+        Index("ix_profiles_geo", self.table.c.latitude, self.table.c.longitude)
+
+    async def init(self):
+        async with self.engine.begin() as conn:
+            await conn.run_sync(self.metadata.create_all)
+            await conn.run_sync(self._add_missing_columns)
+
+    def _add_missing_columns(self, conn):
+        """create_all не меняет существующие таблицы: новые столбцы добавляем сами."""
+        existing = {column["name"] for column in inspect(conn).get_columns(self.table.name)}
+        if_not_exists = "IF NOT EXISTS " if conn.dialect.name == "postgresql" else ""
+        for column in self.table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=conn.dialect)
+                conn.execute(text(f"ALTER TABLE {self.table.name} ADD COLUMN {if_not_exists}{column.name} {column_type}"))
+
+    async def close(self):
+        await self.engine.dispose()
+
+    def _insert(self):
+        dialect = postgresql if self.engine.dialect.name == "postgresql" else sqlite
+        return dialect.insert(self.table)
+
+    def _to_dict(self, row):
+        profile = dict(row._mapping)
+        profile.pop("id")
+        return profile
+
+    def _where(self, query, filters):
+        c = self.table.c
+        if filters.gender:
+            query = query.where(c.gender == filters.gender)
+        if filters.min_age is not None:
+            query = query.where(c.age >= filters.min_age)
+        if filters.max_age is not None:
+            query = query.where(c.age <= filters.max_age)
+        if filters.city:
+            query = query.where(func.lower(c.city) == filters.city.lower())
+        if filters.exclude:
+            query = query.where(c.user_id.notin_(filters.exclude))
+        return query
+
+    async def save(self, profile):
+        stmt = self._insert().values(**profile)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[self.table.c.user_id],
+            set_={k: v for k, v in profile.items() if k != "user_id"},
+        )
+        async with self.engine.begin() as conn:
+            await conn.execute(stmt)
+
+    async def get(self, user_id):
+        async with self.engine.connect() as conn:
+            result = await conn.execute(select(self.table).where(self.table.c.user_id == user_id))
+            row = result.first()
+        return self._to_dict(row) if row else None
+
+    async def get_many(self, user_ids):
+        if not user_ids:
+            return []
+        async with self.engine.connect() as conn:
+            result = await conn.execute(select(self.table).where(self.table.c.user_id.in_(user_ids)))
+            found = {row.user_id: self._to_dict(row) for row in result}
+        return [found[i] for i in user_ids if i in found]
+
+    async def list_page(self, cursor, limit, filters):
+        # Keyset-пагинация по автоинкрементному id: без OFFSET, стоимость не растёт с номером страницы
+        query = self._where(select(self.table), filters).order_by(self.table.c.id).limit(limit + 1)
+        if cursor:
+            query = query.where(self.table.c.id > int(cursor))
+
+        async with self.engine.connect() as conn:
+            rows = (await conn.execute(query)).all()
+
+        next_cursor = str(rows[limit - 1].id) if len(rows) > limit else None
+        return [self._to_dict(row) for row in rows[:limit]], next_cursor
+
+    async def stream(self, filters):
+        query = self._where(select(self.table), filters).order_by(self.table.c.id)
+        query = query.execution_options(yield_per=STREAM_CHUNK_SIZE)
+        async with self.engine.connect() as conn:
+            result = await conn.stream(query)
+            async for row in result:
+                yield self._to_dict(row)
+
+
+    async def stream_without_interest_ids(self):
+        # Читаем пачками и отпускаем соединение: вызывающий код сохраняет анкеты по ходу обхода
+        c = self.table.c
+        last_id = 0
+        while True:
+            query = select(self.table).where(c.interest_ids.is_(None), c.id > last_id).order_by(c.id).limit(STREAM_CHUNK_SIZE)
+            async with self.engine.connect() as conn:
+                rows = (await conn.execute(query)).all()
+            if not rows:
+                return
+            last_id = rows[-1].id
+            for row in rows:
+                yield self._to_dict(row)
+
+
+def create_store(url=PROFILE_STORE_URL):
+    if not url or url.startswith("memory"):
+        return MemoryProfileStore()
+    return SQLProfileStore(url)
@@ -0,0 +1,23 @@
+import fakeredis.aioredis
+from interests import InterestIndex, normalize_interests
+
+
+def test_variants_collapse_to_one_interest():
+    assert normalize_interests(["Football", "football ", "футбол", "#Кино!", "", "  "]) == ["football", "movies"]
+
+
+def test_ids_are_stable_and_index_follows_changes(run):
+    r = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    index = InterestIndex(r)
+
+    async def scenario():
+        first = await index.ids(["Футбол", "Йога"])
+        again = await index.ids(["yoga", "soccer", "Шахматы"])
+        await index.update("7", [], first)
+        await index.update("7", first, again[2:] + first[:1])
+        return first, again, {k: await r.smembers(k) for k in await r.keys("interest:*:users")}
+
+    first, again, postings = run(scenario())
+    assert first == [1, 2]
+    assert again == [2, 1, 3]
+    assert postings == {"interest:1:users": {"7"}, "interest:3:users": {"7"}}
@@ -0,0 +1,50 @@
+import sqlite3
+import fakeredis.aioredis
+import main
+from interests import InterestIndex
+from storage import SQLProfileStore
+
+
+def legacy_database(path):
+    """Таблица profiles в том виде, в каком её создавала версия без interest_ids."""
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE profiles (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id VARCHAR(64) NOT NULL UNIQUE,"
+        " name VARCHAR(255) NOT NULL, age INTEGER NOT NULL, gender VARCHAR(16) NOT NULL, interests JSON NOT NULL,"
+        " city VARCHAR(255) NOT NULL, photos JSON NOT NULL, latitude FLOAT NOT NULL, longitude FLOAT NOT NULL,"
+        " username VARCHAR(255))"
+    )
+    conn.execute(
+        "INSERT INTO profiles (user_id, name, age, gender, interests, city, photos, latitude, longitude)"
+        " VALUES ('1', 'Аня', 25, 'female', ?, 'Москва', '[]', 55.7, 37.6)",
+        ('["Футбол", "кино"]',),
+    )
+    conn.commit()
+    conn.close()
+
+
+def test_init_adds_interest_ids_and_backfills(tmp_path, run, monkeypatch):
+    path = tmp_path / "profiles.db"
+    legacy_database(path)
+    r = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    store = SQLProfileStore(f"sqlite+aiosqlite:///{path}")
+    monkeypatch.setattr(main, "store", store)
+    monkeypatch.setattr(main, "interest_index", InterestIndex(r))
+
+    async def scenario():
+        await store.init()
+        # Повторный init не должен падать на уже добавленном столбце
+        await store.init()
+        await main.backfill_interest_ids()
+        profile = await store.get("1")
+        postings = {i: await r.smembers(f"interest:{i}:users") for i in profile["interest_ids"]}
+        # Новая анкета сохраняется в мигрированную таблицу
+        await store.save({**profile, "user_id": "2", "interest_ids": []})
+        remaining = [p async for p in store.stream_without_interest_ids()]
+        await store.close()
+        return profile, postings, remaining
+
+    profile, postings, remaining = run(scenario())
+    assert profile["interest_ids"] == [1, 2]
+    assert postings == {1: {"1"}, 2: {"1"}}
+    assert remaining == []